@@ -0,0 +1,125 @@
+"""
+Writing of animated images from a stream of frames.
+
+The frames are taken from any iterable, e.g. a generator rendering them one
+by one, and each frame is encoded as soon as it is produced, so long
+animations, like time lapse previews, never hold all the frames in memory.
+GIF and APNG are written frame by frame directly to the output file, each
+frame storing only the region which changed since the previous frame.
+WebP is encoded by PIL, which collects the frames before encoding them.
+"""
+
+import struct
+import zlib
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageChops
+
+from png_writer import PNG_SIGNATURE, sub_filter, write_png_chunk
+
+ANIMATION_FORMATS = ("GIF", "PNG", "WEBP")
+
+
+def iter_frame_regions(frames: Iterable[Image.Image]) -> Iterator[tuple[Image.Image, tuple[int, int]]]:
+    """
+    For each RGBA frame, the region which changed since the previous frame,
+    along with its position. The region of the first frame is the whole frame.
+    """
+    prev_frame = None
+    for frame in frames:
+        frame = frame.convert("RGBA")
+        if prev_frame is None:
+            bbox = (0, 0, frame.width, frame.height)
+        else:
+            # unchanged frame still needs single pixel to hold its duration
+            bbox = ImageChops.difference(frame, prev_frame).getbbox(alpha_only=False) or (0, 0, 1, 1)
+        yield frame.crop(bbox), bbox[:2]
+        prev_frame = frame
+
+
+def write_gif(f: BinaryIO, frames: Iterable[Image.Image], duration: int, loop: int = 0) -> int:
+    """
+    Write the frames as animated GIF, each with its own adaptive palette.
+    Transparent pixels are written as black, like the watch screen shows them.
+    Returns the number of written frames.
+    """
+    num_frames = 0
+    for region, offset in iter_frame_regions(frames):
+        region = region.convert("RGB").quantize(method=Image.Quantize.FASTOCTREE)
+        if num_frames == 0:
+            header, _ = GifImagePlugin.getheader(region, info={"loop": loop})
+            f.write(b"".join(header))
+        # previous frame is kept under the changed region
+        params = {"duration": duration, "disposal": 1, "include_color_table": True}
+        f.write(b"".join(GifImagePlugin.getdata(region, offset, **params)))
+        num_frames += 1
+    if num_frames == 0:
+        raise ValueError("No frames to write")
+    f.write(b";")
+    return num_frames
+
+
+def write_apng(f: BinaryIO, frames: Iterable[Image.Image], duration: int, loop: int = 0) -> int:
+    """
+    Write the frames as animated PNG, in RGBA format.
+    Each line is stored with the PNG "Sub" filter.
+    The number of frames is known only after writing all of them, so it is
+    patched in the animation control chunk at the end, which requires `f` to be
+    seekable.
+    Returns the number of written frames.
+    """
+    num_frames = 0
+    sequence_number = 0
+    f.write(PNG_SIGNATURE)
+    for region, (x, y) in iter_frame_regions(frames):
+        width, height = region.size
+        if num_frames == 0:
+            write_png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            actl_pos = f.tell()
+            write_png_chunk(f, b"acTL", struct.pack(">II", 0, loop))
+        # the region replaces the previous frame pixels, which are kept outside of it
+        fctl = struct.pack(">IIIIIHHBB", sequence_number, width, height, x, y, duration, 1000, 0, 0)
+        write_png_chunk(f, b"fcTL", fctl)
+        sequence_number += 1
+        lines = np.asarray(region).reshape(height, width * 4)
+        data = zlib.compress(sub_filter(lines, 4).tobytes())
+        if num_frames == 0:
+            # the first frame is the default image
+            write_png_chunk(f, b"IDAT", data)
+        else:
+            write_png_chunk(f, b"fdAT", struct.pack(">I", sequence_number) + data)
+            sequence_number += 1
+        num_frames += 1
+    if num_frames == 0:
+        raise ValueError("No frames to write")
+    write_png_chunk(f, b"IEND", b"")
+    end_pos = f.tell()
+    f.seek(actl_pos)
+    write_png_chunk(f, b"acTL", struct.pack(">II", num_frames, loop))
+    f.seek(end_pos)
+    return num_frames
+
+
+def write_animation(
+    f: BinaryIO, frames: Iterable[Image.Image], format: str = "GIF", duration: int = 100, loop: int = 0
+) -> int:
+    """
+    Write the frames as animated image in one of the `ANIMATION_FORMATS`,
+    showing each frame for `duration` milliseconds.
+    Returns the number of written frames.
+    """
+    format = format.upper()
+    if format == "GIF":
+        return write_gif(f, frames, duration, loop)
+    if format == "PNG":
+        return write_apng(f, frames, duration, loop)
+    if format == "WEBP":
+        # PIL collects all the frames before encoding them anyway
+        frames = list(frames)
+        if not frames:
+            raise ValueError("No frames to write")
+        frames[0].save(f, format="WEBP", save_all=True, append_images=frames[1:], duration=duration, loop=loop)
+        return len(frames)
+    raise ValueError("Unsupported animation format")
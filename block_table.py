@@ -0,0 +1,132 @@
+"""
+Columnar representation of the blocks info.
+
+`BlockTable` holds the blocks info of one or many watch faces in a NumPy
+structured array, whose records have the same layout as the blocks info
+records in the watch face file, so the table can be read directly from the
+file data, without creating `BlockInfo` object per block.
+The columns are NumPy arrays, which allows vectorized queries over the blocks
+of a whole watch face corpus, e.g.
+
+    table = BlockTable.open_many(paths)
+    hours = table[(table["blocktype"] == BlockType.Hours) & (table["width"] > 40)]
+    print({paths[face_id] for face_id in hours["face_id"]})
+"""
+
+import os
+from typing import BinaryIO
+
+import numpy as np
+
+from smawf import BlockInfo, BlockType, Header
+
+BLOCK_DTYPE = np.dtype(
+    [
+        ("img_offset", "<u4"),
+        ("img_id", "<u2"),
+        ("width", "<u2"),
+        ("height", "<u2"),
+        ("pos_x", "<u2"),
+        ("pos_y", "<u2"),
+        ("num_imgs", "u1"),
+        # block type in the lower 7 bits, RGBA flag in the highest bit
+        ("type", "u1"),
+        ("align", "u1"),
+        ("compr", "u1"),
+        ("cent_y", "u1"),
+        ("cent_x", "u1"),
+    ]
+)
+assert BLOCK_DTYPE.itemsize == BlockInfo.size
+
+
+class BlockTable:
+    def __init__(self, records: np.ndarray, face_ids: np.ndarray | None = None):
+        self.records = records
+        self.face_ids = np.zeros(len(records), dtype=np.uint32) if face_ids is None else face_ids
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        """
+        Column by its name, or table with the selected rows, for boolean mask,
+        index array or slice.
+        Besides the `BLOCK_DTYPE` fields, the columns are `blocktype`, `is_rgba`
+        and `face_id`, the index of the watch face of each block.
+        """
+        if isinstance(key, str):
+            if key == "blocktype":
+                return self.records["type"] & 0x7F
+            if key == "is_rgba":
+                return (self.records["type"] & 0x80) != 0
+            if key == "face_id":
+                return self.face_ids
+            return self.records[key]
+        return BlockTable(self.records[key], self.face_ids[key])
+
+    def __bytes__(self):
+        return self.records.tobytes()
+
+    @staticmethod
+    def loads(data: bytes | memoryview):
+        """
+        Load the blocks info table from the start of the watch face data,
+        without copying it.
+        """
+        header = Header.loads(data[: Header.size])
+        if len(data) < Header.size + header.num_blocks * BlockInfo.size:
+            raise ValueError("Truncated blocks info")
+        return BlockTable(np.frombuffer(data, dtype=BLOCK_DTYPE, count=header.num_blocks, offset=Header.size))
+
+    @staticmethod
+    def read_from(f: BinaryIO):
+        """
+        Read the blocks info table from the start of the binary file object `f`,
+        without reading the image size table and image resources.
+        """
+        header_data = f.read(Header.size)
+        if len(header_data) != Header.size:
+            raise ValueError("Truncated header")
+        header = Header.loads(header_data)
+        return BlockTable.loads(header_data + f.read(header.num_blocks * BlockInfo.size))
+
+    @staticmethod
+    def open_many(paths: list[str | os.PathLike]):
+        """
+        Read the blocks info tables of many watch face files into one table,
+        where the `face_id` column holds the index of the file in `paths`.
+        """
+        tables = []
+        for path in paths:
+            with open(path, "rb") as f:
+                tables.append(BlockTable.read_from(f))
+        return BlockTable.concatenate(tables)
+
+    @staticmethod
+    def concatenate(tables: list["BlockTable"]):
+        """
+        Concatenate the tables of single watch faces, with the `face_id` column
+        holding the index of the table in `tables`.
+        """
+        records = np.concatenate([table.records for table in tables]) if tables else np.empty(0, dtype=BLOCK_DTYPE)
+        face_ids = np.repeat(np.arange(len(tables), dtype=np.uint32), [len(table) for table in tables])
+        return BlockTable(records, face_ids)
+
+    @staticmethod
+    def from_blocks_info(blocks_info: list[BlockInfo]):
+        return BlockTable(np.frombuffer(b"".join(bytes(bi) for bi in blocks_info), dtype=BLOCK_DTYPE))
+
+    def to_blocks_info(self) -> list[BlockInfo]:
+        return [BlockInfo.from_fields(record) for record in self.records.tolist()]
+
+    def select(self, blocktype: BlockType | None = None, **conditions):
+        """
+        Rows of the given block type, whose columns are equal to the given values.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if blocktype is not None:
+            mask &= self["blocktype"] == blocktype
+        for name, value in conditions.items():
+            mask &= self[name] == value
+        return self[mask]
@@ -0,0 +1,31 @@
+"""
+Helpers shared by the command line scripts.
+"""
+
+import argparse
+import glob
+import pathlib
+
+
+def find_input_files(input_path: str) -> list[pathlib.Path]:
+    """
+    Watch face files given by `input_path`, which is a file, a directory with
+    `.bin` files or a glob pattern.
+    """
+    path = pathlib.Path(input_path)
+    if path.is_file():
+        return [path]
+    if path.is_dir():
+        return sorted(path.glob("*.bin"))
+    return sorted(pathlib.Path(p) for p in glob.glob(input_path))
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    """
+    Parse size given as `WIDTHxHEIGHT`.
+    """
+    width, _, height = size.partition("x")
+    try:
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid size `{size}`, expected WIDTHxHEIGHT")
@@ -1,27 +1,109 @@
 import argparse
+import os
 import pathlib
+import struct
 import sys
-from smawf import WatchFace
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+import smawf
+from cli_utils import find_input_files
+from png_writer import PNG_SIGNATURE, sub_filter, write_png_chunk
+from smawf import ImageData, WatchFace
+
+
+@lru_cache(maxsize=8)
+def open_watch_face(input_file: pathlib.Path) -> WatchFace:
+    return WatchFace.open(input_file)
+
+
+def init_worker():
+    # every image is decoded only once, no need to keep them around
+    smawf.image_cache.max_bytes = 0
+
+
+def save_png(output_file: pathlib.Path, img_data: ImageData, band_height: int = 16):
+    """
+    Save the image as PNG file, decoding and compressing it band by band,
+    so that the whole image is never held in memory.
+    Each line is stored with the PNG "Sub" filter.
+    """
+    b_per_pix = 4 if img_data.is_rgba else 3
+    line_length = img_data.width * b_per_pix
+    compressor = zlib.compressobj()
+    with open(output_file, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        color_type = 6 if img_data.is_rgba else 2
+        write_png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", img_data.width, img_data.height, 8, color_type, 0, 0, 0))
+        for band in img_data.iter_rows(band_height):
+            lines = np.frombuffer(band, dtype=np.uint8).reshape(-1, line_length)
+            filtered = sub_filter(lines, b_per_pix)
+            compressed = compressor.compress(filtered.tobytes())
+            if compressed:
+                write_png_chunk(f, b"IDAT", compressed)
+        write_png_chunk(f, b"IDAT", compressor.flush())
+        write_png_chunk(f, b"IEND", b"")
+
+
+def extract_image(input_file: pathlib.Path, i_img: int, output_file: pathlib.Path) -> int:
+    wf = open_watch_face(input_file)
+    img_data = wf.imgs_data[i_img]
+    save_png(output_file, img_data)
+    return len(img_data.data)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         prog="SMA smart watches face decompressor",
         description="Decompress the image resources from SMA smart watches watch face files",
     )
-    parser.add_argument("-i", "--input_file", type=pathlib.Path, required=True)
+    parser.add_argument(
+        "-i",
+        "--input_file",
+        required=True,
+        help="watch face file, directory with watch face files or glob pattern",
+    )
     parser.add_argument("-o", "--output_dir", type=pathlib.Path)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
     args = parser.parse_args()
-    if not args.input_file.exists():
+    input_files = find_input_files(args.input_file)
+    if not input_files:
         print(f"Input file `{args.input_file}` does not exist")
         sys.exit(-1)
-    output_dir = (
-        args.output_dir if args.output_dir else pathlib.Path(args.input_file.stem)
+    is_batch = len(input_files) > 1 or not pathlib.Path(args.input_file).is_file()
+
+    # one task per image, so that big watch faces are spread across workers
+    tasks = []
+    num_faces = 0
+    num_bytes = 0
+    for input_file in input_files:
+        try:
+            wf = WatchFace.open(input_file)
+        except (ValueError, IndexError) as e:
+            print(f"Skipping `{input_file}`: {e}")
+            continue
+        if is_batch:
+            output_dir = (args.output_dir if args.output_dir else pathlib.Path()) / input_file.stem
+        else:
+            output_dir = args.output_dir if args.output_dir else pathlib.Path(input_file.stem)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(len(wf.imgs_data)):
+            tasks.append((input_file, i, output_dir / f"{i:03d}.png"))
+        num_faces += 1
+        num_bytes += input_file.stat().st_size
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker) as executor:
+        results = executor.map(extract_image, *zip(*tasks), chunksize=16) if tasks else []
+        for task, _ in zip(tasks, results):
+            if not is_batch:
+                print(f"Extracted image {task[2].name}")
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(
+        f"Extracted {len(tasks)} images from {num_faces} watch faces in {elapsed:.2f} s "
+        f"({num_faces / elapsed:.1f} faces/s, {num_bytes / elapsed / 1e6:.1f} MB/s, {len(tasks) / elapsed:.1f} images/s)"
     )
-    output_dir.mkdir(parents=True, exist_ok=True)
-    with open(args.input_file, "rb") as f:
-        wf_data = f.read()
-    wf = WatchFace.loads(wf_data)
-    for i, img_data in enumerate(wf.imgs_data):
-        print("Extracting image {i:03d}.png")
-        img = img_data.decompress()
-        img.save(output_dir / f"{i:03d}.png")
@@ -5,7 +5,7 @@ import sys
 
 from PIL import Image
 
-from smawf import WatchFace, ImageData, BlockInfo, WatchFaceMetaData
+from smawf import ENCODING_STRATEGIES, WatchFace, BlockInfo, WatchFaceMetaData, assign_img_offsets, pack_many
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -15,6 +15,18 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--input_file", type=pathlib.Path, required=True)
     parser.add_argument("-r", "--input_image_dir", type=pathlib.Path, required=True)
     parser.add_argument("-o", "--output_file", type=pathlib.Path)
+    parser.add_argument(
+        "-s",
+        "--strategy",
+        choices=ENCODING_STRATEGIES,
+        default="greedy",
+        help="encoding strategy for compressed images",
+    )
+    parser.add_argument(
+        "--no-deduplicate",
+        action="store_true",
+        help="store identical images of different blocks separately",
+    )
     args = parser.parse_args()
     if not args.input_file.exists():
         print(f"Input file `{args.input_file}` does not exist")
@@ -26,28 +38,35 @@ if __name__ == "__main__":
         wf_data = f.read()
     wf = WatchFace.loads(wf_data)
     # compress the image resources
-    imgs_data = []
+    imgs = []
     for img_name in sorted(os.listdir(args.input_image_dir)):
         img = Image.open(os.path.join(args.input_image_dir, img_name))
         print(f"Processing {img_name}")
-        img_data = ImageData.pack(img, 0x04)
-        imgs_data.append(img_data)
+        imgs.append(img)
+    imgs_compr = [0x04] * len(imgs)
+    for bi in wf.meta_data.blocks_info:
+        for i in range(bi.num_imgs):
+            if bi.img_id + i < len(imgs):
+                imgs_compr[bi.img_id + i] = bi.compr
+    print(f"Compressing {len(imgs)} images")
+    imgs_data, imgs_size_info = pack_many(imgs, imgs_compr, strategy=args.strategy)
+    if args.strategy != "greedy":
+        _, greedy_imgs_size_info = pack_many(imgs, imgs_compr)
+        saved = sum(greedy_imgs_size_info) - sum(imgs_size_info)
+        print(f"Encoding strategy `{args.strategy}` saved {saved} bytes compared to greedy encoding")
     # update meta data
     print("Adjusting watch face meta data")
-    # update image size info table
-    imgs_size_info = [len(bytes(img_data)) for img_data in imgs_data]
-    # update imgs offsets in blocks
-    img_offset = wf.meta_data.blocks_info[0].img_offset
     blocks_info = []
     for bi in wf.meta_data.blocks_info:
         block_info = BlockInfo(
-            img_offset=img_offset,
+            img_offset=bi.img_offset,
             img_id=bi.img_id,
             width=bi.width,
             height=bi.height,
             pos_x=bi.pos_x,
             pos_y=bi.pos_y,
             num_imgs=bi.num_imgs,
+            is_rgba=bi.is_rgba,
             blocktype=bi.blocktype,
             align=bi.align,
             compr=bi.compr,
@@ -55,11 +74,12 @@ if __name__ == "__main__":
             cent_y=bi.cent_y,
         )
         blocks_info.append(block_info)
-        for i in range(bi.num_imgs):
-            img_offset += imgs_size_info[bi.img_id + i]
+    meta_data = WatchFaceMetaData(wf.meta_data.header, blocks_info, imgs_size_info)
+    # update imgs offsets in blocks, storing identical images only once
+    saved = assign_img_offsets(meta_data, imgs_data, deduplicate=not args.no_deduplicate)
+    if saved:
+        print(f"Deduplication of identical images saved {saved} bytes")
     print("Saving new watch face file")
-    new_wf = WatchFace(
-        WatchFaceMetaData(wf.meta_data.header, blocks_info, imgs_size_info), imgs_data
-    )
+    new_wf = WatchFace(meta_data, imgs_data)
     with open(args.output_file, "wb") as f:
-        f.write(bytes(new_wf))
+        new_wf.write_to(f)
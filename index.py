@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import pathlib
+import sqlite3
+import sys
+
+from cli_utils import find_input_files, parse_size
+from smawf import BlockType, WatchFaceMetaData, get_arm_block_types
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS faces (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    num_blocks INTEGER NOT NULL,
+    num_imgs INTEGER NOT NULL,
+    imgs_size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    path TEXT NOT NULL REFERENCES faces(path) ON DELETE CASCADE,
+    block_id INTEGER NOT NULL,
+    blocktype TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    pos_x INTEGER NOT NULL,
+    pos_y INTEGER NOT NULL,
+    num_imgs INTEGER NOT NULL,
+    is_rgba INTEGER NOT NULL,
+    align INTEGER NOT NULL,
+    compr INTEGER NOT NULL,
+    imgs_size INTEGER NOT NULL,
+    PRIMARY KEY (path, block_id)
+);
+CREATE INDEX IF NOT EXISTS blocks_blocktype ON blocks(blocktype);
+CREATE TABLE IF NOT EXISTS skipped (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    file_size INTEGER NOT NULL,
+    error TEXT NOT NULL
+);
+"""
+
+
+def open_index(database: pathlib.Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(database)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def read_meta_data(path: pathlib.Path) -> tuple[WatchFaceMetaData, str]:
+    """
+    Read the meta data of the watch face, along with the hash of the meta
+    data, which is all the index is built from.
+    Only the header, blocks info and image size table are read from the file.
+    """
+    with open(path, "rb") as f:
+        meta_data = WatchFaceMetaData.read_from(f)
+    return meta_data, hashlib.blake2b(bytes(meta_data)).hexdigest()
+
+
+def index_face(
+    conn: sqlite3.Connection,
+    path: pathlib.Path,
+    mtime_ns: int,
+    file_size: int,
+    meta_data: WatchFaceMetaData,
+    digest: str,
+):
+    """
+    Store the meta data of the watch face in the index, replacing the previous entry.
+    """
+    blocks_info = meta_data.blocks_info
+    # the watch face area is covered by all the blocks, except the preview and the arms rotated around their center
+    area_blocks = [
+        bi for bi in blocks_info if bi.blocktype != BlockType.Preview and bi.blocktype not in get_arm_block_types()
+    ]
+    width = max((bi.pos_x + bi.width for bi in area_blocks), default=0)
+    height = max((bi.pos_y + bi.height for bi in area_blocks), default=0)
+    conn.execute("DELETE FROM faces WHERE path = ?", (str(path),))
+    conn.execute(
+        "INSERT INTO faces VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            str(path),
+            mtime_ns,
+            file_size,
+            digest,
+            width,
+            height,
+            len(blocks_info),
+            meta_data.header.num_img_info_size,
+            sum(meta_data.imgs_size_info),
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                str(path),
+                i,
+                str(bi.blocktype),
+                bi.width,
+                bi.height,
+                bi.pos_x,
+                bi.pos_y,
+                bi.num_imgs,
+                bi.is_rgba,
+                bi.align,
+                bi.compr,
+                sum(meta_data.imgs_size_info[bi.img_id : bi.img_id + bi.num_imgs]),
+            )
+            for i, bi in enumerate(blocks_info)
+        ],
+    )
+
+
+def update_index(conn: sqlite3.Connection, input_files: list[pathlib.Path]) -> tuple[int, int, int]:
+    """
+    Index the given watch face files, parsing only the files which changed
+    since they were indexed. A file whose modification time or size changed,
+    but its meta data did not, is not indexed again.
+    Files which fail to parse are recorded in the `skipped` table, and are
+    not parsed again until they change.
+    Entries of the files which no longer exist are removed.
+    Returns the number of indexed, unchanged and skipped files.
+    """
+    indexed = {
+        path: (mtime_ns, file_size, digest)
+        for path, mtime_ns, file_size, digest in conn.execute("SELECT path, mtime_ns, file_size, hash FROM faces")
+    }
+    skipped = {
+        path: (mtime_ns, file_size)
+        for path, mtime_ns, file_size in conn.execute("SELECT path, mtime_ns, file_size FROM skipped")
+    }
+    num_indexed = 0
+    num_unchanged = 0
+    num_skipped = 0
+    for path in input_files:
+        stat = path.stat()
+        entry = indexed.get(str(path))
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            num_unchanged += 1
+            continue
+        if skipped.get(str(path)) == (stat.st_mtime_ns, stat.st_size):
+            num_skipped += 1
+            continue
+        try:
+            meta_data, digest = read_meta_data(path)
+        except (ValueError, AssertionError) as e:
+            print(f"Skipping `{path}`: {e}")
+            conn.execute("DELETE FROM faces WHERE path = ?", (str(path),))
+            conn.execute(
+                "INSERT OR REPLACE INTO skipped VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_mtime_ns, stat.st_size, str(e)),
+            )
+            num_skipped += 1
+            continue
+        conn.execute("DELETE FROM skipped WHERE path = ?", (str(path),))
+        if entry is not None and entry[2] == digest:
+            conn.execute(
+                "UPDATE faces SET mtime_ns = ?, file_size = ? WHERE path = ?",
+                (stat.st_mtime_ns, stat.st_size, str(path)),
+            )
+            num_unchanged += 1
+            continue
+        index_face(conn, path, stat.st_mtime_ns, stat.st_size, meta_data, digest)
+        num_indexed += 1
+    removed = [(path,) for path in indexed.keys() | skipped.keys() if not pathlib.Path(path).exists()]
+    conn.executemany("DELETE FROM faces WHERE path = ?", removed)
+    conn.executemany("DELETE FROM skipped WHERE path = ?", removed)
+    conn.commit()
+    return num_indexed, num_unchanged, num_skipped
+
+
+def query_index(
+    conn: sqlite3.Connection,
+    blocktypes: tuple[str, ...] = (),
+    rgba: bool = False,
+    max_size: tuple[int, int] | None = None,
+    compr: int | None = None,
+) -> list[str]:
+    """
+    Find the indexed watch faces having blocks of all the given types
+    (RGBA blocks only, if `rgba` is set, or any RGBA block when no types are
+    given), fitting `max_size` and using the given compression for any of the
+    blocks.
+    """
+    conditions = []
+    params = []
+    if rgba and not blocktypes:
+        conditions.append("EXISTS (SELECT 1 FROM blocks b WHERE b.path = faces.path AND b.is_rgba)")
+    for blocktype in blocktypes:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM blocks b WHERE b.path = faces.path AND b.blocktype = ?"
+            + (" AND b.is_rgba" if rgba else "")
+            + ")"
+        )
+        params.append(blocktype)
+    if max_size is not None:
+        conditions.append("width <= ? AND height <= ?")
+        params += max_size
+    if compr is not None:
+        conditions.append("EXISTS (SELECT 1 FROM blocks b WHERE b.path = faces.path AND b.compr = ? AND b.num_imgs)")
+        params.append(compr)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return [path for (path,) in conn.execute(f"SELECT path FROM faces{where} ORDER BY path", params)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="SMA smart watches face index",
+        description="Index the meta data of watch face files in SQLite database and query it",
+    )
+    parser.add_argument("-d", "--database", type=pathlib.Path, default=pathlib.Path("wf_index.sqlite"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update_parser = subparsers.add_parser("update", help="index new and changed watch face files")
+    update_parser.add_argument(
+        "input", nargs="+", help="watch face file, directory with watch face files or glob pattern"
+    )
+    query_parser = subparsers.add_parser("query", help="list the indexed watch faces matching all the given filters")
+    query_parser.add_argument(
+        "-t",
+        "--blocktype",
+        choices=[str(t) for t in BlockType],
+        action="append",
+        default=[],
+        help="watch face has block of this type",
+    )
+    query_parser.add_argument(
+        "--rgba",
+        action="store_true",
+        help="blocks of the given types are RGBA, or any block is RGBA when no types are given",
+    )
+    query_parser.add_argument("--fits", type=parse_size, help="watch face fits WIDTHxHEIGHT")
+    query_parser.add_argument("--compr", type=lambda c: int(c, 0), help="any block uses this compression")
+    query_parser.add_argument("--sql", help="run SQL query on `faces` and `blocks` tables instead")
+    args = parser.parse_args()
+    conn = open_index(args.database)
+    if args.command == "update":
+        input_files = [path for input_path in args.input for path in find_input_files(input_path)]
+        if not input_files:
+            print("No watch face files found")
+            sys.exit(-1)
+        num_indexed, num_unchanged, num_skipped = update_index(conn, input_files)
+        print(f"Indexed {num_indexed} watch faces, {num_unchanged} unchanged, {num_skipped} skipped")
+    elif args.sql:
+        for row in conn.execute(args.sql):
+            print(*row, sep="\t")
+    else:
+        for path in query_index(conn, args.blocktype, args.rgba, args.fits, args.compr):
+            print(path)
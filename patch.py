@@ -0,0 +1,58 @@
+import argparse
+import pathlib
+import sys
+
+from smawf import BLOCK_FIELD_ENUMS, BlockType, patch_metadata
+
+
+def parse_edit(edit: str) -> tuple[int | BlockType, dict]:
+    """
+    Parse edit given as `BLOCK:FIELD=VALUE[,FIELD=VALUE...]`, where `BLOCK` is
+    block index or block type name, e.g. `3:pos_x=10,pos_y=20` or
+    `HoursArm:cent_x=120`.
+    """
+    block, _, fields_str = edit.partition(":")
+    if not fields_str:
+        raise argparse.ArgumentTypeError(f"Invalid edit `{edit}`")
+    try:
+        key = int(block) if block.isdigit() else BlockType[block]
+        fields = {}
+        for field in fields_str.split(","):
+            name, _, value = field.partition("=")
+            fields[name] = (
+                BLOCK_FIELD_ENUMS[name][value] if name in BLOCK_FIELD_ENUMS and not value.isdigit() else int(value)
+            )
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"Invalid edit `{edit}`")
+    return key, fields
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="SMA smart watches face patch script",
+        description="Edit the blocks info of watch face files in place, without re-encoding the image resources",
+    )
+    parser.add_argument("-i", "--input_file", type=pathlib.Path, nargs="+", required=True)
+    parser.add_argument(
+        "-e",
+        "--edit",
+        type=parse_edit,
+        action="append",
+        required=True,
+        help="block edit given as BLOCK:FIELD=VALUE[,FIELD=VALUE...], where BLOCK is block index or block type",
+    )
+    args = parser.parse_args()
+    edits = {}
+    for key, fields in args.edit:
+        edits.setdefault(key, {}).update(fields)
+    failed = False
+    for input_file in args.input_file:
+        try:
+            num_patched = patch_metadata(input_file, edits)
+        except (OSError, ValueError, IndexError) as e:
+            print(f"Skipping `{input_file}`: {e}")
+            failed = True
+            continue
+        print(f"Patched {num_patched} blocks in `{input_file}`")
+    if failed:
+        sys.exit(-1)
@@ -0,0 +1,30 @@
+"""
+Low level helpers for writing PNG files chunk by chunk, used to stream images
+to the file without building them in memory first.
+"""
+
+import struct
+import zlib
+from typing import BinaryIO
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def write_png_chunk(f: BinaryIO, chunk_type: bytes, data: bytes):
+    f.write(struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+
+def sub_filter(lines: np.ndarray, b_per_pix: int) -> np.ndarray:
+    """
+    Apply the PNG "Sub" filter to the lines given as (height, line length)
+    array of bytes, returning the lines prefixed with their filter type byte.
+    The filter suits the flat areas typical for watch face images.
+    """
+    height, line_length = lines.shape
+    filtered = np.empty((height, line_length + 1), dtype=np.uint8)
+    filtered[:, 0] = 1
+    filtered[:, 1 : b_per_pix + 1] = lines[:, :b_per_pix]
+    filtered[:, b_per_pix + 1 :] = lines[:, b_per_pix:] - lines[:, :-b_per_pix]
+    return filtered
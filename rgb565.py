@@ -0,0 +1,100 @@
+"""
+Conversion between RGB565 and RGB888 colors.
+
+The watch face pixel data is stored as big-endian RGB565 words, while PIL
+images use 8 bits per channel.
+Expanding the 5/6 bit channels to 8 bits is done with a precomputed table
+holding the RGB888 color for each of the 65536 RGB565 values.
+Quantising 8 bit channels to 5/6 bits is done with one table per channel,
+which already places the channel bits at their position in the RGB565 word.
+
+The conversion functions work on single colors, NumPy arrays and on whole
+buffers (bytes, bytearray or memoryview) of packed pixel data.
+"""
+
+from collections.abc import Sequence
+from numbers import Integral
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _expand_channel(value: int, bits: int) -> int:
+    max_value = (1 << bits) - 1
+    return (value * 255 + max_value // 2) // max_value
+
+
+RED_TO_RGB565 = [(r & 0xF8) << 8 for r in range(256)]
+GREEN_TO_RGB565 = [(g & 0xFC) << 3 for g in range(256)]
+BLUE_TO_RGB565 = [b >> 3 for b in range(256)]
+
+_red = [_expand_channel(r, 5) for r in range(32)]
+_green = [_expand_channel(g, 6) for g in range(64)]
+_blue = [_expand_channel(b, 5) for b in range(32)]
+if np is not None:
+    RGB565_TO_RGB888 = np.empty((0x10000, 3), dtype=np.uint8)
+    _rgb565 = np.arange(0x10000)
+    RGB565_TO_RGB888[:, 0] = np.array(_red, dtype=np.uint8)[_rgb565 >> 11]
+    RGB565_TO_RGB888[:, 1] = np.array(_green, dtype=np.uint8)[(_rgb565 >> 5) & 0x3F]
+    RGB565_TO_RGB888[:, 2] = np.array(_blue, dtype=np.uint8)[_rgb565 & 0x1F]
+    RGB565_TO_RGB888.flags.writeable = False
+    _RGB565_TO_RGB888_BYTES = RGB565_TO_RGB888.tobytes()
+    _RED_TO_RGB565 = np.array(RED_TO_RGB565, dtype=np.uint16)
+    _GREEN_TO_RGB565 = np.array(GREEN_TO_RGB565, dtype=np.uint16)
+    _BLUE_TO_RGB565 = np.array(BLUE_TO_RGB565, dtype=np.uint16)
+    del _rgb565
+else:
+    RGB565_TO_RGB888 = None
+    _RGB565_TO_RGB888_BYTES = b"".join(bytes((r, g, b)) for r in _red for g in _green for b in _blue)
+del _red, _green, _blue
+
+
+def to_rgb888(rgb565):
+    """
+    Convert RGB565 colors to RGB888.
+    The input can be:
+    - single RGB565 value (Python or NumPy integer), returning (red, green,
+      blue) tuple,
+    - NumPy array of RGB565 values, returning uint8 array with additional
+      last axis of size 3,
+    - bytes-like buffer of big-endian RGB565 words, returning bytes with
+      packed RGB888 pixels.
+    """
+    if isinstance(rgb565, Integral):
+        rgb565 = int(rgb565)
+        return tuple(_RGB565_TO_RGB888_BYTES[3 * rgb565 : 3 * rgb565 + 3])
+    if np is not None:
+        if isinstance(rgb565, np.ndarray):
+            return RGB565_TO_RGB888[rgb565]
+        return RGB565_TO_RGB888[np.frombuffer(rgb565, dtype=">u2")].tobytes()
+    data = memoryview(rgb565).cast("B")
+    offsets = (3 * ((data[i] << 8) | data[i + 1]) for i in range(0, len(data), 2))
+    return b"".join(_RGB565_TO_RGB888_BYTES[offset : offset + 3] for offset in offsets)
+
+
+def to_rgb565(rgb888):
+    """
+    Convert RGB888 colors to RGB565.
+    The input can be:
+    - single (red, green, blue) sequence, like tuple or list, returning RGB565
+      value,
+    - NumPy array with last axis holding at least 3 channels (any extra
+      channel, like alpha, is ignored), returning uint16 array,
+    - bytes-like buffer of packed RGB888 pixels, returning bytes with
+      big-endian RGB565 words.
+    """
+    if isinstance(rgb888, Sequence) and not isinstance(rgb888, (bytes, bytearray, memoryview)):
+        r, g, b = (int(c) for c in rgb888[:3])
+        return RED_TO_RGB565[r] | GREEN_TO_RGB565[g] | BLUE_TO_RGB565[b]
+    if np is not None:
+        if isinstance(rgb888, np.ndarray):
+            return _RED_TO_RGB565[rgb888[..., 0]] | _GREEN_TO_RGB565[rgb888[..., 1]] | _BLUE_TO_RGB565[rgb888[..., 2]]
+        pixels = np.frombuffer(rgb888, dtype=np.uint8).reshape(-1, 3)
+        return to_rgb565(pixels).astype(">u2").tobytes()
+    data = memoryview(rgb888).cast("B")
+    return b"".join(
+        (RED_TO_RGB565[data[i]] | GREEN_TO_RGB565[data[i + 1]] | BLUE_TO_RGB565[data[i + 2]]).to_bytes(2, "big")
+        for i in range(0, len(data), 3)
+    )
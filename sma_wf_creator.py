@@ -19,6 +19,9 @@ from smawf import (
     WatchFaceMetaData,
     Header as WatchFaceHeader,
     ImageData,
+    assign_img_offsets,
+    pack_many,
+    select_compression,
 )
 
 
@@ -174,42 +177,56 @@ class SmaWfCreator(QMainWindow, SmaWfCreatorWindow):
         self.scene.addItem(img)
         self.layer_items.append(layer)
         layer.update_info()
+        return layer
 
     def load_watch_face(self):
         file_name, _ = QFileDialog.getOpenFileName(self, "Open Watch Face File", "", "Bin Files (*.bin)")
         if file_name:
             self.remove_all_layers()
-            with open(file_name, "rb") as f:
-                wf_data = f.read()
-            watch_face = WatchFace.loads(wf_data)
+            watch_face = WatchFace.open(file_name)
             self.image_items.clear()
             for bi in watch_face.meta_data.blocks_info:
-                images = [watch_face.imgs_data[bi.img_id + i_img].unpack() for i_img in range(bi.num_imgs)]
-                self.create_layer(bi, images)
+                imgs_data = watch_face.imgs_data[bi.img_id : bi.img_id + bi.num_imgs]
+                images = [img_data.unpack() for img_data in imgs_data]
+                layer = self.create_layer(bi, images)
+                if all(img_data.compression == bi.compr for img_data in imgs_data):
+                    # keep the already encoded images, copied out of the memory mapped file
+                    layer.set_imgs_data(
+                        [ImageData(bytes(d.data), d.compression, d.width, d.height, d.is_rgba) for d in imgs_data]
+                    )
             self.gbParams.setEnabled(False)
 
     def create_watch_face(self):
+        # encode only the images of the layers changed since the last save
+        dirty_layers = [layer for layer in self.layer_items if layer.is_dirty()]
+        imgs = []
+        imgs_compr = []
+        self.compression_report = []
+        for layer in dirty_layers:
+            bi = layer.block_info
+            layer_images = layer.get_images()
+            if layer.auto_compression and layer_images:
+                bi.compr, saved = select_compression(layer_images)
+                self.compression_report.append(f"{bi.blocktype}: 0x{bi.compr:02X}, saved {saved} bytes")
+            imgs += layer_images
+            imgs_compr += [bi.compr] * len(layer_images)
+        packed_imgs_data, _ = pack_many(imgs, imgs_compr)
+        for layer in dirty_layers:
+            num_imgs = len(layer.get_images())
+            layer.set_imgs_data(packed_imgs_data[:num_imgs])
+            packed_imgs_data = packed_imgs_data[num_imgs:]
         blocks_info = []
         imgs_data = []
-        img_offset = 0
-        img_id = 0
         for layer in self.layer_items:
             bi = layer.block_info
-            bi.img_offset = img_offset
-            bi.img_id = img_id
-            layer_images = layer.get_images()
-            for img in layer_images:
-                img_data = ImageData.pack(img, bi.compr)
-                imgs_data.append(img_data)
-                img_offset += len(bytes(img_data))
-            img_id += len(layer_images)
+            bi.img_id = len(imgs_data)
+            imgs_data += layer.imgs_data
             blocks_info.append(bi)
         imgs_size_info = [len(bytes(img_data)) for img_data in imgs_data]
         header = WatchFaceHeader(len(imgs_data), len(blocks_info), 2)
-        # adjust img offsets
         metadata = WatchFaceMetaData(header, blocks_info, imgs_size_info)
-        for bi in blocks_info:
-            bi.img_offset += len(bytes(metadata))
+        # adjust img offsets, storing identical images only once
+        self.deduplication_saved = assign_img_offsets(metadata, imgs_data)
         return WatchFace(metadata, imgs_data)
 
     def save_watch_face(self):
@@ -217,8 +234,13 @@ class SmaWfCreator(QMainWindow, SmaWfCreatorWindow):
         if file_name:
             with open(file_name, "wb") as f:
                 wf = self.create_watch_face()
-                f.write(bytes(wf))
-            QMessageBox.information(self, "Save Watch Face", "Watch Face saved successfully")
+                wf.write_to(f)
+            message = "Watch Face saved successfully"
+            if self.deduplication_saved:
+                message += f"\n\nDuplicate images stored once, saved {self.deduplication_saved} bytes"
+            if self.compression_report:
+                message += "\n\nAutomatically selected compression:\n" + "\n".join(self.compression_report)
+            QMessageBox.information(self, "Save Watch Face", message)
 
     def preview_watch_face(self):
         wf = self.create_watch_face()
@@ -252,7 +274,7 @@ class SmaWfCreator(QMainWindow, SmaWfCreatorWindow):
             self.lwWfLayers.item(index).setSelected(True)
             self.lwWfLayers.scrollToItem(self.lwWfLayers.item(index))
         self.lwWfLayers.blockSignals(False)
-    
+
     def select_layer(self, index):
         self.lwWfLayers.blockSignals(True)
         self.lwWfLayers.clearSelection()
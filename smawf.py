@@ -1,19 +1,36 @@
-from dataclasses import dataclass
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import timedelta
+from functools import cached_property
+from itertools import repeat
+import hashlib
+import math
+import mmap
+import multiprocessing
+import os
 import struct
+import threading
+from typing import BinaryIO
 from PIL import Image
 from enum import IntEnum
 
+from rgb565 import to_rgb565, to_rgb888
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 def rgb565_to_rgb888(rgb565: int) -> tuple[int, int, int]:
-    red = ((rgb565 >> 11) * 255 + 15) // 31
-    green = (((rgb565 >> 5) & 0x3F) * 255 + 31) // 63
-    blue = ((rgb565 & 0x1F) * 255 + 15) // 31
-    return (red, green, blue)
+    return to_rgb888(rgb565)
 
 
 def rgb888_to_rgb565(r: int, g: int, b: int) -> int:
-    rgb565 = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-    return rgb565
+    return to_rgb565((r, g, b))
 
 
 class BlockType(IntEnum):
@@ -96,12 +113,9 @@ class Header:
     _struct = struct.Struct("<HBB")
     size = _struct.size
 
-    def __post_init__(self):
-        object.__setattr__(
-            self,
-            "_bytes",
-            self._struct.pack(self.num_img_info_size, self.num_blocks, self.dnk),
-        )
+    @cached_property
+    def _bytes(self) -> bytes:
+        return self._struct.pack(self.num_img_info_size, self.num_blocks, self.dnk)
 
     def __bytes__(self):
         return self._bytes
@@ -150,6 +164,13 @@ class BlockInfo:
     @staticmethod
     def loads(data: bytes):
         assert len(data) == BlockInfo.size
+        return BlockInfo.from_fields(BlockInfo._struct.unpack(data))
+
+    @staticmethod
+    def from_fields(fields: tuple):
+        """
+        Create block info from the fields as unpacked with `BlockInfo._struct`.
+        """
         (
             img_addr,
             picidx,
@@ -163,7 +184,7 @@ class BlockInfo:
             compr,
             cent_y,
             cent_x,
-        ) = BlockInfo._struct.unpack(data)
+        ) = fields
         is_rgba = blocktype & 0x80 != 0
         blocktype = BlockType(blocktype & 0x7F)
         align = BlockHorizontalAlignment(align)
@@ -192,6 +213,9 @@ class WatchFaceMetaData:
     header: Header
     blocks_info: list[BlockInfo]
     imgs_size_info: list[int]
+    # indices of the images stored in the file, in the order they are stored,
+    # or None when all images are stored one after another in the blocks order
+    stored_img_ids: list[int] | None = field(default=None, repr=False, compare=False)
 
     def __bytes__(self):
         return (
@@ -201,25 +225,99 @@ class WatchFaceMetaData:
         )
 
     @staticmethod
-    def loads(data: bytes):
+    def loads(data: bytes | memoryview):
+        """
+        Parse the meta data from the start of `data`.
+        The blocks info and image size tables are unpacked in one pass each,
+        directly from the buffer, without copying the records.
+        """
+        data = memoryview(data)
         header = Header.loads(data[: Header.size])
+        blocks_end = Header.size + header.num_blocks * BlockInfo.size
+        if len(data) < blocks_end + header.num_img_info_size * IMG_SIZE_INFO_SIZE:
+            raise ValueError("Truncated meta data")
         block_info = [
-            BlockInfo.loads(data[Header.size + i * BlockInfo.size : Header.size + (i + 1) * BlockInfo.size])
-            for i in range(header.num_blocks)
-        ]
-        img_size_info = [
-            int.from_bytes(
-                data[
-                    (Header.size + header.num_blocks * BlockInfo.size + i * 4) : (
-                        Header.size + header.num_blocks * BlockInfo.size + (i + 1) * 4
-                    )
-                ],
-                "little",
-            )
-            for i in range(header.num_img_info_size)
+            BlockInfo.from_fields(fields) for fields in BlockInfo._struct.iter_unpack(data[Header.size : blocks_end])
         ]
+        img_size_info = list(struct.unpack_from(f"<{header.num_img_info_size}I", data, blocks_end))
         return WatchFaceMetaData(header, block_info, img_size_info)
 
+    @staticmethod
+    def read_from(f: BinaryIO):
+        """
+        Read the meta data from the start of the binary file object `f`,
+        without reading any of the image resources.
+        """
+        header_data = f.read(Header.size)
+        if len(header_data) != Header.size:
+            raise ValueError("Truncated header")
+        header = Header.loads(header_data)
+        size = header.num_blocks * BlockInfo.size + header.num_img_info_size * IMG_SIZE_INFO_SIZE
+        return WatchFaceMetaData.loads(header_data + f.read(size))
+
+
+IMAGE_LAYOUT_BLOCK_FIELDS = ("img_offset", "img_id", "num_imgs", "width", "height", "is_rgba", "compr")
+BLOCK_FIELD_ENUMS = {"align": BlockHorizontalAlignment, "blocktype": BlockType}
+
+
+def patch_metadata(path: str | os.PathLike, edits: dict[int | BlockType, dict]) -> int:
+    """
+    Patch the blocks info of an existing watch face file in place.
+    `edits` maps block index, or block type for all blocks of that type, to
+    the new values of the block info fields, e.g. `{3: {"pos_x": 10}}`.
+    Only the blocks info records are rewritten, while the image size table and
+    the image resources are left untouched. Therefore, only the fields which
+    do not change the image data layout can be edited, like the position,
+    alignment or rotation center.
+    Changing any of the `IMAGE_LAYOUT_BLOCK_FIELDS`, or setting the
+    `BLOCK_FIELD_ENUMS` fields to values which are not members of their enum,
+    raises ValueError, before anything is written to the file.
+    Returns the number of patched blocks.
+    """
+    with open(path, "r+b") as f:
+        header = Header.loads(f.read(Header.size))
+        blocks_data = f.read(header.num_blocks * BlockInfo.size)
+        if len(blocks_data) != header.num_blocks * BlockInfo.size:
+            raise ValueError("Truncated blocks info")
+        blocks_info = [BlockInfo.from_fields(fields) for fields in BlockInfo._struct.iter_unpack(blocks_data)]
+        patched = {}
+        for key, fields in edits.items():
+            if isinstance(key, BlockType):
+                ids = [i for i, bi in enumerate(blocks_info) if bi.blocktype == key]
+            else:
+                ids = [key]
+            for i in ids:
+                bi = blocks_info[i]
+                layout = [getattr(bi, name) for name in IMAGE_LAYOUT_BLOCK_FIELDS]
+                for name, value in fields.items():
+                    if name not in BlockInfo.__dataclass_fields__:
+                        raise ValueError(f"Unknown block info field `{name}`")
+                    if name in BLOCK_FIELD_ENUMS:
+                        try:
+                            value = BLOCK_FIELD_ENUMS[name](value)
+                        except ValueError as e:
+                            raise ValueError(f"Invalid value for block {i}: {e}")
+                    setattr(bi, name, value)
+                if [getattr(bi, name) for name in IMAGE_LAYOUT_BLOCK_FIELDS] != layout:
+                    raise ValueError(f"Edit of block {i} changes the image data layout")
+                try:
+                    patched[i] = bytes(bi)
+                except struct.error as e:
+                    raise ValueError(f"Invalid value for block {i}: {e}")
+        for i, data in sorted(patched.items()):
+            f.seek(Header.size + i * BlockInfo.size)
+            f.write(data)
+    return len(patched)
+
+
+ENCODING_STRATEGIES = ("greedy", "optimal")
+COMPRESSION_AUTO = "auto"
+ESTIMATE_SAMPLE_LINES = 32
+# below this total number of pixels, starting worker processes takes longer than packing the images
+PACK_MANY_PARALLEL_PIXELS = 8_000_000
+# from about full screen size, encoding bands of lines in threads costs less than the encoding itself
+COMPRESS_BANDS_MIN_PIXELS = 200_000
+
 
 @dataclass(frozen=True)
 class ImageCompressedLineInfo:
@@ -227,12 +325,9 @@ class ImageCompressedLineInfo:
     line_size: int
     size = 4
 
-    def __post_init__(self):
-        object.__setattr__(
-            self,
-            "_bytes",
-            (self.line_offset | (self.line_size << 21)).to_bytes(4, "little"),
-        )
+    @cached_property
+    def _bytes(self) -> bytes:
+        return (self.line_offset | (self.line_size << 21)).to_bytes(4, "little")
 
     def __bytes__(self):
         return self._bytes
@@ -254,8 +349,9 @@ class ImageCompressedData:
     height: int
     is_rgba: bool
 
-    def __post_init__(self):
-        object.__setattr__(self, "_bytes", self.compressed_data)
+    @cached_property
+    def _bytes(self) -> bytes:
+        return bytes(self.compressed_data)
 
     def __bytes__(self):
         return self._bytes
@@ -303,6 +399,120 @@ class ImageCompressedData:
             provided. The first one has color 0x21AB, the next one 0x22CD.
         """
 
+        return self.decode_rows(0, self.height)
+
+    def decode_rows(self, start: int, stop: int) -> Image.Image:
+        """
+        Decode only the lines from `start` up to, but not including, `stop`.
+        The line info table is used to jump straight to the data of the
+        requested lines, so the other lines are not decoded at all.
+        """
+        start, stop, _ = slice(start, stop).indices(self.height)
+        stop = max(start, stop)
+        lines_info = self.lines_info[start:stop]
+        if np is not None:
+            uncompressed_img_data = self._decompress_array(lines_info).tobytes()
+        else:
+            uncompressed_img_data = self._decompress_bytes(lines_info)
+        mode = "RGBA" if self.is_rgba else "RGB"
+        return Image.frombytes(mode, (self.width, stop - start), uncompressed_img_data)
+
+    def decode_region(self, box: tuple[int, int, int, int]) -> Image.Image:
+        """
+        Decode only the region of the image given by the box
+        (left, upper, right, lower).
+        Only the lines covered by the box are decoded.
+        Like `Image.crop`, the region always has the size of the box, and its
+        part outside of the image is filled with zeros, on both axes.
+        """
+        left, upper, right, lower = box
+        start = min(max(upper, 0), self.height)
+        stop = min(max(lower, start), self.height)
+        return self.decode_rows(start, stop).crop((left, upper - start, right, lower - start))
+
+    def iter_rows(self, band_height: int = 1) -> Iterator[memoryview]:
+        """
+        Decode the image in bands of `band_height` lines (the last band may
+        be shorter), yielding the pixel data of each band.
+        The pixel data is a view into buffer which is reused for the next
+        band, so it's only valid until the next band is requested.
+        The NumPy decoder converts the pixels straight into the buffer, without
+        intermediate copy of the band.
+        """
+        b_per_pix = 4 if self.is_rgba else 3
+        buffer = bytearray(self.width * band_height * b_per_pix)
+        pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, b_per_pix) if np is not None else None
+        for start in range(0, self.height, band_height):
+            lines_info = self.lines_info[start : start + band_height]
+            if pixels is not None:
+                band_size = self._decompress_array(lines_info, pixels).size
+            else:
+                band = self._decompress_bytes(lines_info)
+                band_size = len(band)
+                buffer[:band_size] = band
+            yield memoryview(buffer)[:band_size]
+
+    def _decompress_array(
+        self, lines_info: list[ImageCompressedLineInfo], out: "np.ndarray | None" = None
+    ) -> "np.ndarray":
+        """
+        NumPy based decoder, producing the same pixels as `_decompress_bytes`,
+        as (number of pixels, bytes per pixel) array.
+        The pixels are written to the start of `out` array of that shape, if
+        given, and the written part of it is returned.
+        The prefixes still have to be walked one by one, as the position of the
+        next prefix depends on the current one, but that is done once per run
+        instead of once per pixel.
+        For each run we record the offset of its first pixel value, the number
+        of pixels and the step between the values (0 for "same" runs).
+        These are expanded to the source offset of every pixel, and the pixel
+        values are gathered and converted in one go.
+        """
+        data = self.compressed_data
+        b_per_val = 3 if self.is_rgba else 2
+        run_offsets = []
+        run_counts = []
+        run_steps = []
+        for line_info in lines_info:
+            i = line_info.line_offset
+            line_end = min(line_info.line_offset + line_info.line_size, len(data))
+            while i < line_end:
+                prefix = data[i]
+                n = prefix & 0x7F
+                i += 1
+                run_offsets.append(i)
+                run_counts.append(n)
+                if prefix & 0x80:
+                    run_steps.append(0)
+                    i += b_per_val
+                else:
+                    run_steps.append(b_per_val)
+                    i += n * b_per_val
+        counts = np.array(run_counts, dtype=np.int64)
+        run_starts = np.cumsum(counts) - counts
+        pos_in_run = np.arange(counts.sum(), dtype=np.int64) - np.repeat(run_starts, counts)
+        src = np.repeat(np.array(run_offsets, dtype=np.int64), counts)
+        src += pos_in_run * np.repeat(np.array(run_steps, dtype=np.int64), counts)
+
+        buf = np.frombuffer(data, dtype=np.uint8)
+        if self.is_rgba:
+            alpha = buf[src]
+            src += 1
+        rgb565 = (buf[src].astype(np.uint16) << 8) | buf[src + 1]
+        if out is None:
+            pixels = np.empty((len(src), 4 if self.is_rgba else 3), dtype=np.uint8)
+        else:
+            pixels = out[: len(src)]
+        pixels[:, :3] = to_rgb888(rgb565)
+        if self.is_rgba:
+            pixels[:, 3] = alpha
+        return pixels
+
+    def _decompress_bytes(self, lines_info: list[ImageCompressedLineInfo]) -> bytes:
+        """
+        Pure Python decoder, used when NumPy is not available.
+        """
+
         def decompress_line(line, is_rgba):
             uncompressed_line = bytes()
             i = 0
@@ -341,19 +551,230 @@ class ImageCompressedData:
             return uncompressed_line
 
         uncompressed_img_data = bytes()
-        for line_info in self.lines_info:
+        for line_info in lines_info:
             line_data = self.compressed_data[line_info.line_offset : line_info.line_offset + line_info.line_size]
             uncompressed_img_data += decompress_line(line_data, self.is_rgba)
-        mode = "RGBA" if self.is_rgba else "RGB"
-        return Image.frombytes(mode, (self.width, self.height), uncompressed_img_data)
+        return uncompressed_img_data
 
     @staticmethod
-    def compress(img: Image.Image):
+    def compress(img: Image.Image, workers: int | Executor | None = None, strategy: str = "greedy"):
         """
         Compression goes the other way around from the decompression.
         We process each line of the image and perform RLE.
         We keep track of the length of each compressed line, which also helps with
         calculating the line offset.
+        As each line is encoded independently, bands of lines can be encoded
+        concurrently, and stitched together afterwards.
+        `workers` can be number of worker threads, or an executor to which
+        the bands are submitted.
+        `strategy` selects how the lines are split into segments:
+        - "greedy" starts "same" segment whenever two equal values follow
+          each other,
+        - "optimal" chooses the segments resulting in the smallest line size.
+        """
+        if strategy not in ENCODING_STRATEGIES:
+            raise ValueError("Unsupported encoding strategy")
+        is_rgba = img.mode == "RGBA"
+        width = img.width
+        height = img.height
+        if workers is None or workers == 1 or height < 2:
+            line_sizes, compressed_lines = ImageCompressedData._compress_lines(img, strategy)
+        else:
+            num_bands = workers if isinstance(workers, int) else os.cpu_count() or 1
+            band_height = -(-height // num_bands)
+            bands = [img.crop((0, top, width, min(top + band_height, height))) for top in range(0, height, band_height)]
+            if isinstance(workers, int):
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    bands_lines = list(executor.map(ImageCompressedData._compress_lines, bands, repeat(strategy)))
+            else:
+                bands_lines = list(workers.map(ImageCompressedData._compress_lines, bands, repeat(strategy)))
+            line_sizes = [line_size for band_line_sizes, _ in bands_lines for line_size in band_line_sizes]
+            compressed_lines = b"".join(band_compressed_lines for _, band_compressed_lines in bands_lines)
+
+        lines_info = []
+        line_offset = ImageCompressedLineInfo.size * height
+        for line_size in line_sizes:
+            lines_info.append(ImageCompressedLineInfo(line_offset, line_size))
+            line_offset += line_size
+        compressed_data = b"".join(bytes(li) for li in lines_info) + compressed_lines
+        # pad compressed data to length of 4
+        compressed_data += b"\x00" * (-len(compressed_data) % 4)
+        return ImageCompressedData(lines_info, compressed_data, width, height, is_rgba)
+
+    @staticmethod
+    def _compress_lines(img: Image.Image, strategy: str = "greedy") -> tuple[list[int], bytes]:
+        """
+        Returns the size of each compressed line and the concatenated lines.
+        """
+        if strategy == "optimal":
+            return ImageCompressedData._compress_optimal(img)
+        if np is not None and img.mode in ("RGB", "RGBA"):
+            return ImageCompressedData._compress_array(img)
+        return ImageCompressedData._compress_bytes(img)
+
+    @staticmethod
+    def _compress_optimal(img: Image.Image) -> tuple[list[int], bytes]:
+        """
+        Encoder choosing the segments which minimise the size of each line.
+        Returns the size of each compressed line and the concatenated lines.
+        """
+        is_rgba = img.mode == "RGBA"
+        b_per_val = 3 if is_rgba else 2
+        if np is not None and img.mode in ("RGB", "RGBA"):
+            pixels = np.asarray(img, dtype=np.uint8)
+            rgb565 = to_rgb565(pixels)
+            vals = [rgb565 >> 8, rgb565 & 0xFF]
+            if is_rgba:
+                vals.insert(0, pixels[..., 3])
+            vals = np.stack(vals, axis=-1).astype(np.uint8)
+            lines = [line.tobytes() for line in vals]
+        else:
+            pixels = img.load()
+            val_struct = struct.Struct(">BH" if is_rgba else ">H")
+            lines = []
+            for i_line in range(img.height):
+                line_pixels = [pixels[col, i_line] for col in range(img.width)]
+                if is_rgba:
+                    line_vals = (val_struct.pack(p[3], rgb888_to_rgb565(*p[:3])) for p in line_pixels)
+                else:
+                    line_vals = (val_struct.pack(rgb888_to_rgb565(*p[:3])) for p in line_pixels)
+                lines.append(b"".join(line_vals))
+        compressed_lines = [ImageCompressedData._compress_line_optimal(line, b_per_val) for line in lines]
+        return [len(line) for line in compressed_lines], b"".join(compressed_lines)
+
+    @staticmethod
+    def _compress_line_optimal(line: bytes, b_per_val: int) -> bytes:
+        """
+        Find the segments with the smallest total size using dynamic
+        programming over the pixel values in the line.
+        The smallest size for encoding the first i values is the minimum of:
+        - segment of different values j..i, costing 1 + (i - j) * b_per_val,
+        - "same" segment j..i, costing 1 + b_per_val, if all values in it
+          are equal,
+        added to the smallest size for encoding the first j values, with
+        i - j <= 0x7F.
+        Both minimums are taken over sliding windows of j, which are tracked
+        with monotonic queues, so each value is processed in constant time.
+        """
+        vals = [line[i : i + b_per_val] for i in range(0, len(line), b_per_val)]
+        num_vals = len(vals)
+        cost = [0] * (num_vals + 1)
+        choice = [(0, False)] * (num_vals + 1)
+        diff_window = deque()
+        same_window = deque()
+        for i in range(1, num_vals + 1):
+            j = i - 1
+            if j > 0 and vals[j] != vals[j - 1]:
+                # "same" segments can't start before the current run of equal values
+                same_window.clear()
+            diff_key = cost[j] - j * b_per_val
+            while diff_window and cost[diff_window[-1]] - diff_window[-1] * b_per_val >= diff_key:
+                diff_window.pop()
+            diff_window.append(j)
+            while same_window and cost[same_window[-1]] >= cost[j]:
+                same_window.pop()
+            same_window.append(j)
+            while diff_window[0] < i - 0x7F:
+                diff_window.popleft()
+            while same_window[0] < i - 0x7F:
+                same_window.popleft()
+            j_diff = diff_window[0]
+            j_same = same_window[0]
+            diff_cost = cost[j_diff] + 1 + (i - j_diff) * b_per_val
+            same_cost = cost[j_same] + 1 + b_per_val
+            if same_cost <= diff_cost:
+                cost[i] = same_cost
+                choice[i] = (j_same, True)
+            else:
+                cost[i] = diff_cost
+                choice[i] = (j_diff, False)
+
+        segments = []
+        i = num_vals
+        while i > 0:
+            j, same_val = choice[i]
+            if same_val:
+                segments.append(bytes([0x80 | (i - j)]) + vals[j])
+            else:
+                segments.append(bytes([i - j]) + line[j * b_per_val : i * b_per_val])
+            i = j
+        return b"".join(reversed(segments))
+
+    @staticmethod
+    def _compress_array(img: Image.Image) -> tuple[list[int], bytes]:
+        """
+        NumPy based encoder, producing the same output as `_compress_bytes`.
+        The greedy encoder splits each line into maximal runs of equal pixel
+        values: runs of two or more pixels are stored as "same" segments, while
+        consecutive single pixels are grouped into segments of different values.
+        Both kinds of segments are split in chunks of at most 0x7F pixels.
+        Run boundaries are found for the whole image at once, and the prefixes
+        and pixel values of all segments are scattered into the output buffer.
+        Returns the size of each compressed line and the concatenated lines.
+        """
+        is_rgba = img.mode == "RGBA"
+        width = img.width
+        height = img.height
+        num_pixels = width * height
+        b_per_val = 3 if is_rgba else 2
+        pixels = np.asarray(img, dtype=np.uint8).reshape(num_pixels, -1)
+        rgb565 = to_rgb565(pixels).astype(np.uint32)
+        if is_rgba:
+            alpha = pixels[:, 3].astype(np.uint32)
+            vals = (alpha << 16) | rgb565
+            pix_bytes = np.stack([alpha, rgb565 >> 8, rgb565 & 0xFF], axis=1).astype(np.uint8)
+        else:
+            vals = rgb565
+            pix_bytes = np.stack([rgb565 >> 8, rgb565 & 0xFF], axis=1).astype(np.uint8)
+        pix_bytes = pix_bytes.reshape(-1)
+
+        # runs of equal values, never crossing line boundaries
+        run_boundary = np.ones(num_pixels, dtype=bool)
+        run_boundary[1:] = vals[1:] != vals[:-1]
+        run_boundary[::width] = True
+        run_starts = np.flatnonzero(run_boundary)
+        run_lengths = np.diff(np.append(run_starts, num_pixels))
+        is_same = run_lengths > 1
+
+        # group consecutive single pixel runs in the same line
+        run_lines = run_starts // width
+        span_boundary = np.ones(len(run_starts), dtype=bool)
+        span_boundary[1:] = (is_same[1:] != is_same[:-1]) | (run_lines[1:] != run_lines[:-1])
+        span_boundary |= is_same
+        span_ids = np.cumsum(span_boundary) - 1
+        span_starts = run_starts[span_boundary]
+        span_lengths = np.bincount(span_ids, weights=run_lengths).astype(np.int64)
+        span_is_same = is_same[span_boundary]
+
+        # split spans in chunks of at most 0x7F pixels
+        num_chunks = (span_lengths + 0x7E) // 0x7F
+        chunk_span = np.repeat(np.arange(len(span_starts)), num_chunks)
+        chunk_index = np.arange(num_chunks.sum()) - np.repeat(np.cumsum(num_chunks) - num_chunks, num_chunks)
+        chunk_starts = span_starts[chunk_span] + chunk_index * 0x7F
+        chunk_counts = np.minimum(span_lengths[chunk_span] - chunk_index * 0x7F, 0x7F)
+        chunk_is_same = span_is_same[chunk_span]
+        chunk_num_vals = np.where(chunk_is_same, 1, chunk_counts)
+        chunk_vals_size = chunk_num_vals * b_per_val
+        chunk_sizes = 1 + chunk_vals_size
+        chunk_offsets = np.cumsum(chunk_sizes) - chunk_sizes
+
+        compressed = np.empty(chunk_sizes.sum(), dtype=np.uint8)
+        compressed[chunk_offsets] = chunk_counts | np.where(chunk_is_same, 0x80, 0)
+        val_pos = np.arange(chunk_vals_size.sum()) - np.repeat(
+            np.cumsum(chunk_vals_size) - chunk_vals_size, chunk_vals_size
+        )
+        val_dst = np.repeat(chunk_offsets + 1, chunk_vals_size) + val_pos
+        val_src = np.repeat(chunk_starts * b_per_val, chunk_vals_size) + val_pos
+        compressed[val_dst] = pix_bytes[val_src]
+
+        line_sizes = np.bincount(chunk_starts // width, weights=chunk_sizes, minlength=height).astype(np.int64)
+        return line_sizes.tolist(), compressed.tobytes()
+
+    @staticmethod
+    def _compress_bytes(img: Image.Image) -> tuple[list[int], bytes]:
+        """
+        Pure Python encoder, used when NumPy is not available.
+        Returns the size of each compressed line and the concatenated lines.
         """
         is_rgba = img.mode == "RGBA"
         width = img.width
@@ -449,16 +870,60 @@ class ImageCompressedData:
             line = b"".join(b"".join(int.to_bytes(p, 1, "little") for p in pixels[i, i_line]) for i in range(width))
             compr_line = compress_line(line, is_rgba, width)
             compressed_lines.append(compr_line)
-
-        lines_info = []
-        line_offset = ImageCompressedLineInfo.size * height
-        for line in compressed_lines:
-            lines_info.append(ImageCompressedLineInfo(line_offset, len(line)))
-            line_offset += len(line)
-        compressed_data = b"".join(bytes(li) for li in lines_info) + b"".join(compressed_lines)
-        # pad compressed data to length of 4
-        compressed_data += b"\x00" * (-len(compressed_data) % 4)
-        return ImageCompressedData(lines_info, compressed_data, width, height, is_rgba)
+        return [len(line) for line in compressed_lines], b"".join(compressed_lines)
+
+
+class ImageCache:
+    """
+    Cache of decoded images, with least recently used images evicted once the
+    total size of the cached pixel data exceeds `max_bytes`.
+    Images are looked up by key made from the hash of the image data and
+    the parameters needed to decode it, so identical image resources share
+    one entry, even across different watch faces.
+    Setting `max_bytes` to 0 disables the caching.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._imgs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._imgs)
+
+    def get(self, key) -> Image.Image | None:
+        with self._lock:
+            img = self._imgs.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._imgs.move_to_end(key)
+            return img
+
+    def put(self, key, img: Image.Image):
+        img_size = img.width * img.height * len(img.getbands())
+        with self._lock:
+            if key in self._imgs or img_size > self.max_bytes:
+                return
+            self._imgs[key] = img
+            self.size += img_size
+            while self.size > self.max_bytes:
+                _, evicted_img = self._imgs.popitem(last=False)
+                self.size -= evicted_img.width * evicted_img.height * len(evicted_img.getbands())
+
+    def clear(self):
+        with self._lock:
+            self._imgs.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+image_cache = ImageCache()
 
 
 @dataclass(frozen=True)
@@ -469,96 +934,708 @@ class ImageData:
     height: int
     is_rgba: bool
 
-    def __post_init__(self):
-        object.__setattr__(self, "_bytes", self.data)
+    @cached_property
+    def _bytes(self) -> bytes:
+        # data may be a view into memory mapped watch face file
+        return bytes(self.data)
 
     def __bytes__(self):
         return self._bytes
 
     @staticmethod
-    def loads(data: bytes, compression: int, width: int, height: int, is_rgba: bool):
+    def loads(data: bytes | memoryview, compression: int, width: int, height: int, is_rgba: bool):
         if compression != 0x00 and compression != 0x04:
             raise ValueError("Unsupported compression method")
         return ImageData(data, compression, width, height, is_rgba)
 
     def unpack(self) -> Image.Image:
+        """
+        Decode the image data.
+        Decoded images are kept in `image_cache`, and each call returns a copy
+        of the cached image, so the caller is free to modify it.
+        """
+        if "_cache_key" not in self.__dict__:
+            digest = hashlib.blake2b(self.data, digest_size=16).digest()
+            cache_key = (digest, self.compression, self.width, self.height, self.is_rgba)
+            object.__setattr__(self, "_cache_key", cache_key)
+        img = image_cache.get(self._cache_key)
+        if img is None:
+            img = self._unpack()
+            image_cache.put(self._cache_key, img)
+        return img.copy()
+
+    def decode_region(self, box: tuple[int, int, int, int]) -> Image.Image:
+        """
+        Decode only the region of the image given by the box
+        (left, upper, right, lower), without decoding the lines outside of it.
+        Like `Image.crop`, the region always has the size of the box, and its
+        part outside of the image is filled with zeros, on both axes.
+        The decoded region is not cached.
+        """
         if self.compression == 0x00:
-            mode = "RGBA" if self.is_rgba else "RGB"
+            left, upper, right, lower = box
+            start = min(max(upper, 0), self.height)
+            stop = min(max(lower, start), self.height)
             b_per_pix = 3 if self.is_rgba else 2
+            line_length = self.width * b_per_pix
+            stride = line_length + (-line_length % 4)
+            lines_data = ImageData(
+                self.data[start * stride : stop * stride], self.compression, self.width, stop - start, self.is_rgba
+            )
+            return lines_data._unpack().crop((left, upper - start, right, lower - start))
+        elif self.compression == 0x04:
+            compressed_data = ImageCompressedData.loads(self.data, self.width, self.height, self.is_rgba)
+            return compressed_data.decode_region(box)
+
+    def iter_rows(self, band_height: int = 1) -> Iterator[memoryview]:
+        """
+        Decode the image in bands of `band_height` lines (the last band may
+        be shorter), yielding the pixel data of each band.
+        The pixel data is a view into buffer which is reused for the next
+        band, so it's only valid until the next band is requested.
+        The NumPy decoder converts the pixels straight into the buffer, without
+        intermediate copy of the band.
+        """
+        if self.compression == 0x04:
+            compressed_data = ImageCompressedData.loads(self.data, self.width, self.height, self.is_rgba)
+            yield from compressed_data.iter_rows(band_height)
+            return
+        b_per_pix = 3 if self.is_rgba else 2
+        line_length = self.width * b_per_pix
+        stride = line_length + (-line_length % 4)
+        buffer = bytearray(self.width * band_height * (4 if self.is_rgba else 3))
+        pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, 4 if self.is_rgba else 3) if np is not None else None
+        for start in range(0, self.height, band_height):
+            stop = min(start + band_height, self.height)
+            band_data = ImageData(
+                self.data[start * stride : stop * stride], self.compression, self.width, stop - start, self.is_rgba
+            )
+            if pixels is not None:
+                band_size = band_data._unpack_array(pixels).size
+            else:
+                band = band_data._unpack_bytes()
+                band_size = len(band)
+                buffer[:band_size] = band
+            yield memoryview(buffer)[:band_size]
+
+    def _unpack(self) -> Image.Image:
+        if self.compression == 0x00:
             # when compression is 0, data is stored RGB565 + optional Alpha
             # each line must have length multiple of 4, which means
             # each line may be padded if width is not multiple of 4
-            line_length = self.width * b_per_pix
-            pad_size = -line_length % 4
-            line_length += pad_size
-            num_lines = self.height
-            pixels_data = b""
-            for i_line in range(num_lines):
-                line = self.data[i_line * line_length : (i_line + 1) * line_length - pad_size]
-                if self.is_rgba:
-                    pixels_data += b"".join(
-                        struct.Struct("<BBBB").pack(
-                            *rgb565_to_rgb888((line[i + 1] << 8) | (line[i + 2])),
-                            line[i],
-                        )
-                        for i in range(0, len(line), b_per_pix)
-                    )
-                else:
-                    pixels_data += b"".join(
-                        struct.Struct("<BBB").pack(
-                            *rgb565_to_rgb888((line[i] << 8) | (line[i + 1])),
-                        )
-                        for i in range(0, len(line), b_per_pix)
-                    )
+            mode = "RGBA" if self.is_rgba else "RGB"
+            if np is not None:
+                pixels_data = self._unpack_array().tobytes()
+            else:
+                pixels_data = self._unpack_bytes()
             return Image.frombytes(mode, (self.width, self.height), pixels_data)
         elif self.compression == 0x04:
             return ImageCompressedData.loads(self.data, self.width, self.height, self.is_rgba).decompress()
 
+    def _unpack_array(self, out: "np.ndarray | None" = None) -> "np.ndarray":
+        """
+        NumPy based conversion of uncompressed pixel data, producing the same
+        pixels as `_unpack_bytes`, as (height, width, bytes per pixel) array.
+        The data is viewed as (height, padded line length) array, the padding
+        is dropped with a slice and all pixels are converted at once.
+        The pixels are written to the start of `out` array of shape (number of
+        pixels, bytes per pixel), if given, and the written part of it is
+        returned.
+        """
+        b_per_pix = 3 if self.is_rgba else 2
+        line_length = self.width * b_per_pix
+        stride = line_length + (-line_length % 4)
+        data = np.frombuffer(self.data, dtype=np.uint8)
+        missing = stride * self.height - len(data)
+        if missing > stride - line_length:
+            raise ValueError("not enough image data")
+        if missing > 0:
+            # tolerate missing padding at the end of the last line
+            data = np.concatenate([data, np.zeros(missing, dtype=np.uint8)])
+        lines = data[: stride * self.height].reshape(self.height, stride)[:, :line_length]
+        pix = lines.reshape(self.height, self.width, b_per_pix)
+        rgb565 = (pix[..., -2].astype(np.uint16) << 8) | pix[..., -1]
+        if out is None:
+            pixels = np.empty((self.height, self.width, 4 if self.is_rgba else 3), dtype=np.uint8)
+        else:
+            pixels = out[: self.height * self.width].reshape(self.height, self.width, -1)
+        pixels[..., :3] = to_rgb888(rgb565)
+        if self.is_rgba:
+            pixels[..., 3] = pix[..., 0]
+        return pixels
+
+    def _unpack_bytes(self) -> bytes:
+        """
+        Pure Python conversion of uncompressed pixel data, used when NumPy is
+        not available.
+        """
+        b_per_pix = 3 if self.is_rgba else 2
+        line_length = self.width * b_per_pix
+        pad_size = -line_length % 4
+        line_length += pad_size
+        num_lines = self.height
+        pixels_data = b""
+        for i_line in range(num_lines):
+            line = self.data[i_line * line_length : (i_line + 1) * line_length - pad_size]
+            if self.is_rgba:
+                pixels_data += b"".join(
+                    struct.Struct("<BBBB").pack(
+                        *rgb565_to_rgb888((line[i + 1] << 8) | (line[i + 2])),
+                        line[i],
+                    )
+                    for i in range(0, len(line), b_per_pix)
+                )
+            else:
+                pixels_data += b"".join(
+                    struct.Struct("<BBB").pack(
+                        *rgb565_to_rgb888((line[i] << 8) | (line[i + 1])),
+                    )
+                    for i in range(0, len(line), b_per_pix)
+                )
+        return pixels_data
+
     @staticmethod
-    def pack(img: Image.Image, compression: int):
+    def pack(img: Image.Image, compression: int | str, workers: int | Executor | None = None, strategy: str = "greedy"):
+        """
+        Pack the image using the given compression.
+        With `COMPRESSION_AUTO`, the compression resulting in smaller
+        (estimated) size is used, which is available as `compression` of the
+        returned image data.
+        For compression 0x04, `workers` and `strategy` are passed to
+        `ImageCompressedData.compress`. When `workers` is not given, images
+        with at least `COMPRESS_BANDS_MIN_PIXELS` pixels are encoded with one
+        thread per CPU core by the NumPy greedy encoder, which releases the GIL
+        for most of its work, while smaller images are encoded in one go.
+        """
+        if compression == COMPRESSION_AUTO:
+            compression, _ = select_compression([img], strategy)
         if compression != 0x00 and compression != 0x04:
             raise ValueError("Unsupported compression method")
         if compression == 0x00:
             width = img.width
             height = img.height
             is_rgba = img.mode == "RGBA"
-            pixels = img.load()
+            if np is not None and img.mode in ("RGB", "RGBA"):
+                pixels_data = ImageData._pack_array(img)
+            else:
+                pixels_data = ImageData._pack_bytes(img)
+            return ImageData(pixels_data, compression, width, height, is_rgba)
+        elif compression == 0x04:
+            if workers is None and strategy == "greedy" and np is not None:
+                workers = (os.cpu_count() or 1) if img.width * img.height >= COMPRESS_BANDS_MIN_PIXELS else 1
+            compressed_data = ImageCompressedData.compress(img, workers, strategy)
+            return ImageData(bytes(compressed_data), compression, img.width, img.height, compressed_data.is_rgba)
 
-            b_per_pix = 3 if is_rgba else 2
-            line_length = width * b_per_pix
-            pad_size = -line_length % 4
-            line_length += pad_size
-            num_lines = height
-            pixels_data = b""
-            for i_line in range(num_lines):
-                if is_rgba:
-                    line = b"".join(
-                        struct.Struct(">BH").pack(
-                            pixels[col, i_line][3],
-                            rgb888_to_rgb565(
-                                pixels[col, i_line][0],
-                                pixels[col, i_line][1],
-                                pixels[col, i_line][2],
-                            ),
-                        )
-                        for col in range(width)
+    @staticmethod
+    def _pack_array(img: Image.Image) -> bytes:
+        """
+        NumPy based conversion to uncompressed pixel data, producing the same
+        output as `_pack_bytes`.
+        The pixel values are written through a view which skips the padding
+        at the end of each line of the zero-initialised output array.
+        """
+        width = img.width
+        height = img.height
+        is_rgba = img.mode == "RGBA"
+        b_per_pix = 3 if is_rgba else 2
+        line_length = width * b_per_pix
+        stride = line_length + (-line_length % 4)
+        pixels = np.asarray(img, dtype=np.uint8)
+        rgb565 = to_rgb565(pixels)
+        lines = np.zeros((height, stride), dtype=np.uint8)
+        pix = lines[:, :line_length].reshape(height, width, b_per_pix)
+        if is_rgba:
+            pix[..., 0] = pixels[..., 3]
+        pix[..., -2] = rgb565 >> 8
+        pix[..., -1] = rgb565 & 0xFF
+        return lines.tobytes()
+
+    @staticmethod
+    def _pack_bytes(img: Image.Image) -> bytes:
+        """
+        Pure Python conversion to uncompressed pixel data, used when NumPy is
+        not available.
+        """
+        width = img.width
+        height = img.height
+        is_rgba = img.mode == "RGBA"
+        pixels = img.load()
+
+        b_per_pix = 3 if is_rgba else 2
+        line_length = width * b_per_pix
+        pad_size = -line_length % 4
+        line_length += pad_size
+        num_lines = height
+        pixels_data = b""
+        for i_line in range(num_lines):
+            if is_rgba:
+                line = b"".join(
+                    struct.Struct(">BH").pack(
+                        pixels[col, i_line][3],
+                        rgb888_to_rgb565(
+                            pixels[col, i_line][0],
+                            pixels[col, i_line][1],
+                            pixels[col, i_line][2],
+                        ),
                     )
-                else:
-                    line = b"".join(
-                        struct.Struct(">H").pack(
-                            rgb888_to_rgb565(
-                                pixels[col, i_line][0],
-                                pixels[col, i_line][1],
-                                pixels[col, i_line][2],
-                            ),
-                        )
-                        for col in range(width)
+                    for col in range(width)
+                )
+            else:
+                line = b"".join(
+                    struct.Struct(">H").pack(
+                        rgb888_to_rgb565(
+                            pixels[col, i_line][0],
+                            pixels[col, i_line][1],
+                            pixels[col, i_line][2],
+                        ),
                     )
-                line += b"\x00" * pad_size
-                pixels_data += line
-            return ImageData(pixels_data, compression, width, height, is_rgba)
-        elif compression == 0x04:
-            return ImageCompressedData.compress(img)
+                    for col in range(width)
+                )
+            line += b"\x00" * pad_size
+            pixels_data += line
+        return pixels_data
+
+
+def estimate_packed_size(img: Image.Image, compression: int, strategy: str = "greedy") -> int:
+    """
+    Estimate the size of the image packed with the given compression,
+    using the given encoding `strategy` for compression 0x04.
+    The size of uncompressed data is exact.
+    The size of compressed data is exact for images with up to
+    `ESTIMATE_SAMPLE_LINES` lines, while for bigger images it's extrapolated
+    from evenly spaced sample of lines.
+    """
+    if compression == 0x00:
+        b_per_pix = 3 if img.mode == "RGBA" else 2
+        line_length = img.width * b_per_pix
+        return (line_length + (-line_length % 4)) * img.height
+    elif compression == 0x04:
+        if strategy not in ENCODING_STRATEGIES:
+            raise ValueError("Unsupported encoding strategy")
+        if img.height <= ESTIMATE_SAMPLE_LINES:
+            return len(bytes(ImageCompressedData.compress(img, strategy)))
+        sample = Image.new(img.mode, (img.width, ESTIMATE_SAMPLE_LINES))
+        for i in range(ESTIMATE_SAMPLE_LINES):
+            y = i * img.height // ESTIMATE_SAMPLE_LINES
+            sample.paste(img.crop((0, y, img.width, y + 1)), (0, i))
+        line_sizes, _ = ImageCompressedData._compress_lines(sample, strategy)
+        size = ImageCompressedLineInfo.size * img.height + sum(line_sizes) * img.height // ESTIMATE_SAMPLE_LINES
+        return size + (-size % 4)
+    raise ValueError("Unsupported compression method")
+
+
+def select_compression(imgs: list[Image.Image], strategy: str = "greedy") -> tuple[int, int]:
+    """
+    Select the compression resulting in smaller estimated size of all the
+    images, as all images of a block share the same compression.
+    Compression 0x04 is estimated with the given encoding `strategy`.
+    Returns the selected compression and the estimated number of bytes saved
+    compared to the other compression.
+    """
+    sizes = {compr: sum(estimate_packed_size(img, compr, strategy) for img in imgs) for compr in (0x04, 0x00)}
+    compression = min(sizes, key=sizes.get)
+    return compression, max(sizes.values()) - sizes[compression]
+
+
+def pack_many(
+    imgs: list[Image.Image], compression: int | list[int], max_workers: int | None = None, strategy: str = "greedy"
+) -> tuple[list[ImageData], list[int]]:
+    """
+    Pack multiple images.
+    The images are packed in worker processes when `max_workers` is greater
+    than 1, or when it's not given and the images have at least
+    `PACK_MANY_PARALLEL_PIXELS` pixels in total and there are multiple CPU
+    cores (one worker per core). Otherwise they are packed in this process.
+    The compression can be given for all images, or as list with compression
+    for each image.
+    `strategy` selects the encoding strategy for compression 0x04, see
+    `ImageCompressedData.compress`.
+    Returns the packed image data, in the same order as the input images,
+    and their sizes, as needed for the image size info table.
+    """
+    compressions = compression if isinstance(compression, list) else [compression] * len(imgs)
+    if max_workers is None:
+        num_pixels = sum(img.width * img.height for img in imgs)
+        parallel = num_pixels >= PACK_MANY_PARALLEL_PIXELS and (os.cpu_count() or 1) > 1
+    else:
+        parallel = max_workers > 1
+    if len(imgs) < 2 or not parallel:
+        imgs_data = [ImageData.pack(img, compr, strategy=strategy) for img, compr in zip(imgs, compressions)]
+    else:
+        # fork is not safe in multi-threaded processes, like the GUI application
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            # the images are already spread across the processes, no threads within them
+            imgs_data = list(executor.map(ImageData.pack, imgs, compressions, repeat(1), repeat(strategy)))
+    return imgs_data, [len(bytes(img_data)) for img_data in imgs_data]
+
+
+def assign_img_offsets(meta_data: WatchFaceMetaData, imgs_data: list[ImageData], deduplicate: bool = True) -> int:
+    """
+    Set the image offset of each block, with the images of the blocks stored
+    one after another, right after the meta data.
+    `imgs_data` holds the images of all blocks, in the order of the blocks.
+    With `deduplicate`, a block whose images are identical to consecutive
+    images already stored points to them, instead of storing them again.
+    The image size info table still has entry for each image, so only the
+    image offset of the block changes.
+    The images which are stored are recorded in `meta_data.stored_img_ids`.
+    Returns the number of bytes saved by the deduplication.
+    """
+    offset = len(bytes(meta_data))
+    stored_digests = []
+    stored_offsets = []
+    stored_ids = {}
+    stored_img_ids = []
+    saved = 0
+    i_img = 0
+    for bi in meta_data.blocks_info:
+        block_imgs_data = imgs_data[i_img : i_img + bi.num_imgs]
+        i_img += bi.num_imgs
+        digests = [hashlib.blake2b(img_data.data, digest_size=16).digest() for img_data in block_imgs_data]
+        stored_id = None
+        if deduplicate and digests:
+            stored_id = next(
+                (i for i in stored_ids.get(digests[0], []) if stored_digests[i : i + len(digests)] == digests), None
+            )
+        if stored_id is not None:
+            bi.img_offset = stored_offsets[stored_id]
+            saved += sum(len(img_data.data) for img_data in block_imgs_data)
+            continue
+        bi.img_offset = offset
+        stored_img_ids += range(i_img - bi.num_imgs, i_img)
+        for digest, img_data in zip(digests, block_imgs_data):
+            stored_ids.setdefault(digest, []).append(len(stored_digests))
+            stored_digests.append(digest)
+            stored_offsets.append(offset)
+            offset += len(img_data.data)
+    # images not belonging to any block are stored at the end
+    stored_img_ids += range(i_img, len(imgs_data))
+    meta_data.stored_img_ids = stored_img_ids
+    return saved
+
+
+class GlyphAtlas:
+    """
+    Images of a digital block (digits, decimal point, labels), decoded once
+    into a single strip image, with the box of each glyph in the strip.
+    The decoded glyphs are kept as well, so rendering a value only pastes
+    them, without decoding or cropping them.
+    """
+
+    def __init__(self, imgs_data: list[ImageData]):
+        glyphs = [img_data.unpack() for img_data in imgs_data]
+        self.glyphs = glyphs
+        self.boxes = []
+        x = 0
+        for glyph in glyphs:
+            self.boxes.append((x, 0, x + glyph.width, glyph.height))
+            x += glyph.width
+        mode = glyphs[0].mode if glyphs else "RGB"
+        self.image = Image.new(mode, (x, max((glyph.height for glyph in glyphs), default=0)))
+        for glyph, box in zip(glyphs, self.boxes):
+            self.image.paste(glyph, box[:2])
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def glyph(self, i: int) -> Image.Image:
+        """
+        The glyph image, shared by all the renders, so it must not be modified.
+        """
+        return self.glyphs[i]
+
+    def paste(self, img: Image.Image, i: int, pos: tuple[int, int], use_mask: bool):
+        glyph = self.glyphs[i]
+        img.paste(glyph, pos, glyph if use_mask else None)
+
+
+@dataclass
+class SensorState:
+    """
+    Values shown by the blocks of the watch face, like time, activity or weather.
+    """
+
+    hour: int = 9
+    minutes: int = 0
+    seconds: int = 23
+    date_year: int = 25
+    date_month: int = 3
+    date_day: int = 9
+    week_day: int = 3
+    steps: int = 23456
+    distance: float = 22.5
+    calories: int = 2345
+    heart_rate: int = 106
+    battery: int = 100
+    steps_goal: int = 6000
+    distance_goal: float = 5
+    calories_goal: int = 300
+    max_heart_rate: int = 150
+    weather: Weather = Weather.PartlyCloudy
+    # image of the animation block to show, or None to render each image as separate frame
+    animation_frame: int | None = None
+
+
+class DrawOp(ABC):
+    """
+    Step of the render plan, drawing single block on the frames.
+    Static operations draw the same regardless of the sensor state.
+    """
+
+    is_static = False
+
+    def draw(self, imgs: list[Image.Image], state: SensorState) -> list[Image.Image]:
+        for img in imgs:
+            self.draw_frame(img, state)
+        return imgs
+
+    @abstractmethod
+    def draw_frame(self, img: Image.Image, state: SensorState):
+        """
+        Draw the block on the frame `img`, for the given sensor state.
+        """
+
+
+@dataclass
+class PasteOp(DrawOp):
+    image: Image.Image
+    pos: tuple[int, int]
+    use_mask: bool
+    is_static = True
+
+    def draw_frame(self, img: Image.Image, state: SensorState):
+        img.paste(self.image, self.pos, self.image if self.use_mask else None)
+
+
+@dataclass
+class SelectOp(DrawOp):
+    images: list[Image.Image]
+    pos: tuple[int, int]
+    use_mask: bool
+    value: Callable[[SensorState], int]
+
+    def index(self, state: SensorState) -> int:
+        return self.value(state)
+
+    def draw_frame(self, img: Image.Image, state: SensorState):
+        image = self.images[self.index(state)]
+        img.paste(image, self.pos, image if self.use_mask else None)
+
+
+@dataclass
+class StripOp(SelectOp):
+    goal: Callable[[SensorState], float]
+
+    def index(self, state: SensorState) -> int:
+        num_imgs = len(self.images)
+        return min(num_imgs - 1, int(round((self.value(state) // (self.goal(state) / num_imgs)))))
+
+
+@dataclass
+class DigitsOp(DrawOp):
+    atlas: GlyphAtlas
+    # x coordinate of the first drawn digit, or the center of the value for centered blocks
+    anchor_x: int
+    pos_y: int
+    # distance between the digits, negative for right aligned values, drawn from the last digit
+    step_x: int
+    is_centered: bool
+    use_mask: bool
+    value: Callable[[SensorState], float]
+    num_digits: int
+    pad_zeros: bool
+
+    def draw_frame(self, img: Image.Image, state: SensorState):
+        value = self.value(state)
+        value_str = str(value).zfill(self.num_digits) if self.pad_zeros else str(value)
+        start_x = self.anchor_x - (len(str(value)) * self.step_x) // 2 if self.is_centered else self.anchor_x
+        if self.step_x < 0:
+            value_str = value_str[::-1]
+        for i, digit in enumerate(value_str):
+            digit_id = 10 if digit == "." else int(digit)
+            self.atlas.paste(img, digit_id, (start_x + i * self.step_x, self.pos_y), self.use_mask)
+
+
+@dataclass
+class ArmOp(DrawOp):
+    """
+    Arm rotated around the rotation center, placed at the block position.
+    The arm is rotated only within the square around the rotation center,
+    which holds the arm at any angle.
+    The angle is quantised to `angle_steps` steps per full turn, and the
+    rotated arm, cropped to its bounding box, is kept for the last
+    `max_sprites` used steps, so drawing the arm at a recently used angle
+    only pastes it.
+    The default 0.1 degree step keeps the angles of all arms exact for whole
+    seconds.
+    """
+
+    image: Image.Image
+    pos: tuple[int, int]
+    # rotation center within the arm image
+    center: tuple[int, int]
+    angle: Callable[[SensorState], float]
+    angle_steps: int = 3600
+    max_sprites: int = 360
+    sprites: OrderedDict[int, tuple[Image.Image, tuple[int, int]]] = field(default_factory=OrderedDict)
+
+    def sprite(self, step: int) -> tuple[Image.Image, tuple[int, int]]:
+        """
+        Arm rotated by the given angle step, along with its position on the frame.
+        """
+        sprite = self.sprites.get(step)
+        if sprite is not None:
+            self.sprites.move_to_end(step)
+        else:
+            center_x, center_y = self.center
+            max_x = max(center_x, self.image.width - center_x)
+            max_y = max(center_y, self.image.height - center_y)
+            # margin for the bicubic filter
+            radius = math.ceil(math.hypot(max_x, max_y)) + 2
+            canvas = Image.new("RGBA", (2 * radius, 2 * radius), (0, 0, 0, 0))
+            arm = self.image if self.image.mode == "RGBA" else self.image.convert("RGBA")
+            canvas.paste(arm, (radius - center_x, radius - center_y), arm)
+            angle = step * 360 / self.angle_steps
+            canvas = canvas.rotate(-angle, resample=Image.Resampling.BICUBIC, center=(radius, radius))
+            bbox = canvas.getbbox() or (0, 0, 0, 0)
+            pos = (self.pos[0] - radius + bbox[0], self.pos[1] - radius + bbox[1])
+            sprite = (canvas.crop(bbox), pos)
+            self.sprites[step] = sprite
+            if len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        return sprite
+
+    def draw_frame(self, img: Image.Image, state: SensorState):
+        step = round(self.angle(state) * self.angle_steps / 360) % self.angle_steps
+        sprite, pos = self.sprite(step)
+        img.paste(sprite, pos, sprite)
+
+
+@dataclass
+class AnimationOp(DrawOp):
+    images: list[Image.Image]
+    pos: tuple[int, int]
+    use_mask: bool
+
+    def draw(self, imgs: list[Image.Image], state: SensorState) -> list[Image.Image]:
+        if state.animation_frame is not None:
+            return super().draw(imgs, state)
+        imgs = [imgs[0].copy() for _ in self.images]
+        for img, image in zip(imgs, self.images):
+            img.paste(image, self.pos, image if self.use_mask else None)
+        return imgs
+
+    def draw_frame(self, img: Image.Image, state: SensorState):
+        image = self.images[state.animation_frame % len(self.images)]
+        img.paste(image, self.pos, image if self.use_mask else None)
+
+
+# value, number of digits and zero padding of the digital blocks
+DIGITS_BLOCKS = {
+    BlockType.Hours: (lambda s: s.hour, 2, True),
+    BlockType.Minutes: (lambda s: s.minutes, 2, True),
+    BlockType.Seconds: (lambda s: s.seconds, 2, True),
+    BlockType.HoursDigitTens: (lambda s: s.hour // 10, 1, True),
+    BlockType.HoursDigitOnes: (lambda s: s.hour % 10, 1, True),
+    BlockType.MinutesDigitTens: (lambda s: s.minutes // 10, 1, True),
+    BlockType.MinutesDigitOnes: (lambda s: s.minutes % 10, 1, True),
+    BlockType.Year: (lambda s: s.date_year, 2, True),
+    BlockType.Month: (lambda s: s.date_month, 2, True),
+    BlockType.Day: (lambda s: s.date_day, 2, True),
+    BlockType.WeekDay: (lambda s: s.week_day, 1, True),
+    BlockType.Steps: (lambda s: s.steps, 6, False),
+    BlockType.Distance: (lambda s: s.distance, 6, False),
+    BlockType.Calories: (lambda s: s.calories, 4, False),
+    BlockType.HeartRate: (lambda s: s.heart_rate, 3, False),
+    BlockType.Battery: (lambda s: s.battery, 3, False),
+}
+
+# value and goal of the strip blocks
+STRIP_BLOCKS = {
+    BlockType.StepsStrip: (lambda s: s.steps, lambda s: s.steps_goal),
+    BlockType.DistanceStrip: (lambda s: s.distance, lambda s: s.distance_goal),
+    BlockType.CaloriesStrip: (lambda s: s.calories, lambda s: s.calories_goal),
+    BlockType.HeartRateStrip: (lambda s: s.heart_rate, lambda s: s.max_heart_rate),
+    BlockType.BatteryStrip: (lambda s: s.battery, lambda s: 100),
+}
+
+# angle of the arm blocks
+ARM_BLOCKS = {
+    BlockType.HoursArm: lambda s: 30 * (s.hour % 12) + 30 * s.minutes / 60,
+    BlockType.MinutesArm: lambda s: 6 * s.minutes + 6 * s.seconds / 60,
+    BlockType.SecondsArm: lambda s: 6 * s.seconds,
+}
+
+
+class RenderPlan:
+    """
+    Watch face preview, compiled once into a list of draw operations, one per
+    block, holding the decoded images and precomputed positions of the block.
+    Rendering the plan for any sensor state only composes the frames.
+    The static blocks below all the others, like the background, are composed
+    only once into the base frame, from which each rendered frame starts.
+    The watch face is rendered as single frame, or as one frame per image of
+    the animation block, if there is one.
+    """
+
+    def __init__(self, width: int, height: int, ops: list[DrawOp]):
+        self.width = width
+        self.height = height
+        num_static = next((i for i, op in enumerate(ops) if not op.is_static), len(ops))
+        self.base = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        for op in ops[:num_static]:
+            op.draw([self.base], None)
+        self.ops = ops[num_static:]
+
+    def render(self, state: SensorState | None = None) -> list[Image.Image]:
+        state = SensorState() if state is None else state
+        imgs = [self.base.copy()]
+        for op in self.ops:
+            imgs = op.draw(imgs, state)
+        return imgs
+
+    @staticmethod
+    def compile(wf: "WatchFace", width: int, height: int):
+        ops = []
+        for bi in wf.meta_data.blocks_info:
+            pos = (bi.pos_x, bi.pos_y)
+            block_imgs_data = wf.imgs_data[bi.img_id : bi.img_id + bi.num_imgs]
+            if bi.blocktype in (BlockType.Background, BlockType.DistanceLabel):
+                ops.append(PasteOp(wf.imgs_data[bi.img_id].unpack(), pos, False))
+            elif bi.blocktype == BlockType.BackgroundPiece:
+                ops.append(PasteOp(wf.imgs_data[bi.img_id].unpack(), pos, bi.is_rgba))
+            elif bi.blocktype in DIGITS_BLOCKS:
+                value, num_digits, pad_zeros = DIGITS_BLOCKS[bi.blocktype]
+                if bi.blocktype == BlockType.Month and bi.num_imgs == 12:
+                    num_digits = 1
+                is_right = bi.align == BlockHorizontalAlignment.Right
+                ops.append(
+                    DigitsOp(
+                        wf.glyph_atlas(bi),
+                        bi.pos_x - bi.width if is_right else bi.pos_x,
+                        bi.pos_y,
+                        -bi.width if is_right else bi.width,
+                        bi.align == BlockHorizontalAlignment.Center,
+                        bi.is_rgba,
+                        value,
+                        num_digits,
+                        pad_zeros,
+                    )
+                )
+            elif bi.blocktype in ARM_BLOCKS:
+                center = (bi.width - bi.cent_x, bi.height - bi.cent_y)
+                ops.append(ArmOp(wf.imgs_data[bi.img_id].unpack(), pos, center, ARM_BLOCKS[bi.blocktype]))
+            elif bi.blocktype in STRIP_BLOCKS:
+                value, goal = STRIP_BLOCKS[bi.blocktype]
+                ops.append(StripOp([d.unpack() for d in block_imgs_data], pos, bi.is_rgba, value, goal))
+            elif bi.blocktype == BlockType.Animation:
+                ops.append(AnimationOp([d.unpack() for d in block_imgs_data], pos, bi.is_rgba))
+            elif bi.blocktype == BlockType.Weather:
+                # one image for each weather, which may follow the images of the block
+                weather_imgs_data = wf.imgs_data[bi.img_id : bi.img_id + len(Weather)]
+                ops.append(SelectOp([d.unpack() for d in weather_imgs_data], pos, bi.is_rgba, lambda s: s.weather))
+        return RenderPlan(width, height, ops)
 
 
 @dataclass(frozen=True)
@@ -566,20 +1643,74 @@ class WatchFace:
     meta_data: WatchFaceMetaData
     imgs_data: list[ImageData]
 
-    def __post_init__(self):
-        object.__setattr__(
-            self,
-            "_bytes",
-            bytes(self.meta_data) + b"".join(bytes(id) for id in self.imgs_data),
-        )
+    @cached_property
+    def _bytes(self) -> bytes:
+        return bytes(self.meta_data) + b"".join(bytes(id) for id in self._stored_imgs_data())
 
     def __bytes__(self):
         return self._bytes
 
+    def write_to(self, f: BinaryIO) -> int:
+        """
+        Write the watch face to the binary file object `f`.
+        Meta data is written first, followed by each of the image resources,
+        without building the whole watch face data in memory.
+        Returns the number of written bytes.
+        """
+        num_bytes = f.write(bytes(self.meta_data))
+        for img_data in self._stored_imgs_data():
+            num_bytes += f.write(img_data.data)
+        return num_bytes
+
+    def _stored_imgs_data(self) -> list[ImageData]:
+        """
+        Image data in the order they are stored in the file.
+        Without `stored_img_ids` of the meta data, all images are stored.
+        Otherwise only the recorded images are stored (see
+        `assign_img_offsets`), and the image offset of each block must point
+        to stored images identical to the images of the block.
+        """
+        stored_img_ids = self.meta_data.stored_img_ids
+        if stored_img_ids is None:
+            return self.imgs_data
+        stored_imgs_data = [self.imgs_data[img_id] for img_id in stored_img_ids]
+        offset = len(bytes(self.meta_data))
+        stored_at = {}
+        for img_data in stored_imgs_data:
+            stored_at[offset] = img_data
+            offset += len(img_data.data)
+        i_img = 0
+        for i, bi in enumerate(self.meta_data.blocks_info):
+            offset = bi.img_offset
+            for img_data in self.imgs_data[i_img : i_img + bi.num_imgs]:
+                stored = stored_at.get(offset)
+                if stored is None or (stored is not img_data and stored.data != img_data.data):
+                    raise ValueError(f"Image offset of block {i} does not point to its stored images")
+                offset += len(img_data.data)
+            i_img += bi.num_imgs
+        return stored_imgs_data
+
     @staticmethod
-    def loads(data: bytes):
+    def open(path: str | os.PathLike):
+        """
+        Load watch face from file without reading the image resources.
+        The file is memory mapped, and only the header, blocks info and image
+        size tables are parsed.
+        The image data holds zero-copy views into the mapped file, so the
+        image resources are read from the file only when they are unpacked
+        or serialized.
+        The mapping is released once the watch face and all of its image data
+        are no longer referenced.
+        """
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return WatchFace.loads(memoryview(data))
+
+    @staticmethod
+    def loads(data: bytes | memoryview):
         meta_data = WatchFaceMetaData.loads(data)
         imgs_data = []
+        imgs_offset = []
         for bi in meta_data.blocks_info:
             offset = bi.img_offset
             start_id = bi.img_id
@@ -588,9 +1719,51 @@ class WatchFace:
                 img_size = meta_data.imgs_size_info[img_id]
                 img_data = ImageData.loads(data[offset : offset + img_size], bi.compr, bi.width, bi.height, bi.is_rgba)
                 imgs_data.append(img_data)
+                imgs_offset.append(offset)
                 offset += img_size
+        offset = len(bytes(meta_data))
+        for img_offset, img_data in zip(imgs_offset, imgs_data):
+            if img_offset != offset:
+                # images shared by several blocks, or stored out of the blocks order
+                first_img_ids = {}
+                for img_id, img_offset in enumerate(imgs_offset):
+                    first_img_ids.setdefault(img_offset, img_id)
+                meta_data.stored_img_ids = [first_img_ids[img_offset] for img_offset in sorted(first_img_ids)]
+                break
+            offset += len(img_data.data)
         return WatchFace(meta_data, imgs_data)
 
+    @cached_property
+    def _glyph_atlases(self) -> dict[tuple[int, int], "GlyphAtlas"]:
+        return {}
+
+    def glyph_atlas(self, block_info: BlockInfo) -> "GlyphAtlas":
+        """
+        Glyph atlas of the images of the block, decoded on first use and kept
+        for the next previews.
+        """
+        key = (block_info.img_id, block_info.num_imgs)
+        atlas = self._glyph_atlases.get(key)
+        if atlas is None:
+            atlas = GlyphAtlas(self.imgs_data[block_info.img_id : block_info.img_id + block_info.num_imgs])
+            self._glyph_atlases[key] = atlas
+        return atlas
+
+    @cached_property
+    def _render_plans(self) -> dict[tuple[int, int], "RenderPlan"]:
+        return {}
+
+    def render_plan(self, width: int, height: int) -> "RenderPlan":
+        """
+        Render plan of the watch face for frames of the given size, compiled
+        on first use and kept for the next previews.
+        """
+        plan = self._render_plans.get((width, height))
+        if plan is None:
+            plan = RenderPlan.compile(self, width, height)
+            self._render_plans[(width, height)] = plan
+        return plan
+
     def preview(
         self,
         width: int,
@@ -613,154 +1786,62 @@ class WatchFace:
         max_heart_rate=150,
         weather=Weather.PartlyCloudy,
     ) -> list[Image.Image]:
-        def digital_block_paste(
-            img: Image.Image, block_info: BlockInfo, value: float, num_digits: int, pad_zeros: bool = True
-        ):
-            value_str = str(value).zfill(num_digits) if pad_zeros else str(value)
-            sign = -1 if block_info.align == BlockHorizontalAlignment.Right else 1
-            start_x = (
-                block_info.pos_x - block_info.width
-                if block_info.align == BlockHorizontalAlignment.Right
-                else block_info.pos_x - (len(str(value)) * block_info.width) // 2
-                if block_info.align == BlockHorizontalAlignment.Center
-                else block_info.pos_x
+        state = SensorState(
+            hour=hour,
+            minutes=minutes,
+            seconds=seconds,
+            date_year=date_year,
+            date_month=date_month,
+            date_day=date_day,
+            week_day=week_day,
+            steps=steps,
+            distance=distance,
+            calories=calories,
+            heart_rate=heart_rate,
+            battery=battery,
+            steps_goal=steps_goal,
+            distance_goal=distance_goal,
+            calories_goal=calories_goal,
+            max_heart_rate=max_heart_rate,
+            weather=weather,
+        )
+        return self.render_plan(width, height).render(state)
+
+    def time_lapse(
+        self,
+        width: int,
+        height: int,
+        start: timedelta,
+        end: timedelta,
+        step: timedelta,
+        state: SensorState | None = None,
+    ) -> Iterator[Image.Image]:
+        """
+        Frames of the watch face showing the time of the day from `start` up
+        to `end` (not included), advancing by `step` on each frame.
+        The other values shown by the watch face are taken from `state`.
+        The frames are rendered one by one, when requested, all with the same
+        render plan. The animation block, if any, advances by one image on
+        each frame.
+        """
+        if step <= timedelta(0):
+            raise ValueError("Time lapse step must be positive")
+        plan = self.render_plan(width, height)
+        state = SensorState() if state is None else state
+        time = start
+        i_frame = 0
+        while time < end:
+            seconds = int(time.total_seconds())
+            frame_state = replace(
+                state,
+                hour=seconds // 3600 % 24,
+                minutes=seconds // 60 % 60,
+                seconds=seconds % 60,
+                animation_frame=i_frame,
             )
-            if sign == -1:
-                value_str = value_str[::-1]
-            for i, digit in enumerate(value_str):
-                if digit == ".":
-                    digit_id = 10
-                else:
-                    digit_id = int(digit)
-                layer_img = self.imgs_data[block_info.img_id + digit_id].unpack()
-                mask = layer_img if block_info.is_rgba else None
-                img.paste(layer_img, (start_x + sign * i * block_info.width, block_info.pos_y), mask)
-
-        def analog_block_paste(img: Image.Image, block_info: BlockInfo, angle: float, width: int, height: int):
-            layer_img = self.imgs_data[block_info.img_id].unpack()
-            new_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-            center_x = block_info.width - block_info.cent_x
-            center_y = block_info.height - block_info.cent_y
-            x = block_info.pos_x - center_x
-            y = block_info.pos_y - center_y
-            mask = layer_img if block_info.is_rgba else None
-            new_img.paste(layer_img, (x, y), mask)
-            new_center_x = x + center_x
-            new_center_y = y + center_y
-            new_img = new_img.rotate(-angle, resample=Image.Resampling.BICUBIC, center=(new_center_x, new_center_y))
-            new_mask = new_img if block_info.is_rgba else None
-            img.paste(new_img, (0, 0), new_mask)
-
-        def strip_block_paste(img: Image.Image, block_info: BlockInfo, value: float, goal: float):
-            id = min(block_info.num_imgs - 1, int(round((value // (goal / block_info.num_imgs)))))
-            layer_img = self.imgs_data[block_info.img_id + id].unpack()
-            mask = layer_img if block_info.is_rgba else None
-            img.paste(layer_img, (block_info.pos_x, block_info.pos_y), mask)
-
-        imgs = [Image.new("RGBA", (width, height), (0, 0, 0, 0))]
-        for bi in self.meta_data.blocks_info:
-            if bi.blocktype == BlockType.Background:
-                for img in imgs:
-                    img.paste(self.imgs_data[bi.img_id].unpack(), (bi.pos_x, bi.pos_y))
-            elif bi.blocktype == BlockType.BackgroundPiece:
-                bg_img = self.imgs_data[bi.img_id].unpack()
-                mask = bg_img if bi.is_rgba else None
-                for img in imgs:
-                    img.paste(bg_img, (bi.pos_x, bi.pos_y), mask)
-            elif bi.blocktype == BlockType.Hours:
-                for img in imgs:
-                    digital_block_paste(img, bi, hour, 2)
-            elif bi.blocktype == BlockType.Minutes:
-                for img in imgs:
-                    digital_block_paste(img, bi, minutes, 2)
-            elif bi.blocktype == BlockType.Seconds:
-                for img in imgs:
-                    digital_block_paste(img, bi, seconds, 2)
-            elif bi.blocktype == BlockType.HoursDigitTens:
-                for img in imgs:
-                    digital_block_paste(img, bi, hour // 10, 1)
-            elif bi.blocktype == BlockType.HoursDigitOnes:
-                for img in imgs:
-                    digital_block_paste(img, bi, hour % 10, 1)
-            elif bi.blocktype == BlockType.MinutesDigitTens:
-                for img in imgs:
-                    digital_block_paste(img, bi, minutes // 10, 1)
-            elif bi.blocktype == BlockType.MinutesDigitOnes:
-                for img in imgs:
-                    digital_block_paste(img, bi, minutes % 10, 1)
-            elif bi.blocktype == BlockType.HoursArm:
-                for img in imgs:
-                    angle = 30 * (hour % 12) + 30 * minutes / 60
-                    analog_block_paste(img, bi, angle, width, height)
-            elif bi.blocktype == BlockType.MinutesArm:
-                for img in imgs:
-                    angle = 6 * minutes + 6 * seconds / 60
-                    analog_block_paste(img, bi, angle, width, height)
-            elif bi.blocktype == BlockType.SecondsArm:
-                for img in imgs:
-                    angle = 6 * seconds
-                    analog_block_paste(img, bi, angle, width, height)
-            elif bi.blocktype == BlockType.Year:
-                for img in imgs:
-                    digital_block_paste(img, bi, date_year, 2)
-            elif bi.blocktype == BlockType.Month:
-                num_digits = 1 if bi.num_imgs == 12 else 2
-                for img in imgs:
-                    digital_block_paste(img, bi, date_month, num_digits)
-            elif bi.blocktype == BlockType.Day:
-                for img in imgs:
-                    digital_block_paste(img, bi, date_day, 2)
-            elif bi.blocktype == BlockType.WeekDay:
-                for img in imgs:
-                    digital_block_paste(img, bi, week_day, 1)
-            elif bi.blocktype == BlockType.Steps:
-                for img in imgs:
-                    digital_block_paste(img, bi, steps, 6, False)
-            elif bi.blocktype == BlockType.StepsStrip:
-                for img in imgs:
-                    strip_block_paste(img, bi, steps, steps_goal)
-            elif bi.blocktype == BlockType.Distance:
-                for img in imgs:
-                    digital_block_paste(img, bi, distance, 6, False)
-            elif bi.blocktype == BlockType.DistanceStrip:
-                for img in imgs:
-                    strip_block_paste(img, bi, distance, distance_goal)
-            elif bi.blocktype == BlockType.DistanceLabel:
-                for img in imgs:
-                    img.paste(self.imgs_data[bi.img_id].unpack(), (bi.pos_x, bi.pos_y))
-            elif bi.blocktype == BlockType.Calories:
-                for img in imgs:
-                    digital_block_paste(img, bi, calories, 4, False)
-            elif bi.blocktype == BlockType.CaloriesStrip:
-                for img in imgs:
-                    strip_block_paste(img, bi, calories, calories_goal)
-            elif bi.blocktype == BlockType.HeartRate:
-                for img in imgs:
-                    digital_block_paste(img, bi, heart_rate, 3, False)
-            elif bi.blocktype == BlockType.HeartRateStrip:
-                for img in imgs:
-                    strip_block_paste(img, bi, heart_rate, max_heart_rate)
-            elif bi.blocktype == BlockType.Battery:
-                for img in imgs:
-                    digital_block_paste(img, bi, battery, 3, False)
-            elif bi.blocktype == BlockType.BatteryStrip:
-                for img in imgs:
-                    strip_block_paste(img, bi, battery, 100)
-            elif bi.blocktype == BlockType.Animation:
-                anim_layer_imgs = [self.imgs_data[bi.img_id + i].unpack() for i in range(bi.num_imgs)]
-                imgs = [imgs[0].copy() for _ in range(bi.num_imgs)]
-                for i, anim_img in enumerate(anim_layer_imgs):
-                    mask = anim_img if bi.is_rgba else None
-                    imgs[i].paste(anim_img, (bi.pos_x, bi.pos_y), mask)
-            elif bi.blocktype == BlockType.Weather:
-                weather_img = self.imgs_data[bi.img_id + weather].unpack()
-                mask = weather_img if bi.is_rgba else None
-                for img in imgs:
-                    img.paste(weather_img, (bi.pos_x, bi.pos_y), mask)
-            else:
-                # print(f"Can't use block type {bi.blocktype} for preview")
-                pass
-        return imgs
+            yield plan.render(frame_state)[0]
+            time += step
+            i_frame += 1
 
 
 def get_arm_block_types():
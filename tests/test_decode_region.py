@@ -0,0 +1,58 @@
+import random
+
+from PIL import Image
+
+from smawf import ImageCompressedData, ImageData
+
+
+def make_image(mode: str, width: int, height: int) -> Image.Image:
+    rnd = random.Random(width * height)
+    img = Image.new(mode, (width, height))
+    # runs of equal pixels, so that compression uses both kinds of segments
+    img.putdata([(rnd.randrange(4) * 80, 0, rnd.randrange(2) * 255, 255)[: len(mode)] for _ in range(width * height)])
+    return img
+
+
+BOXES = [
+    (0, 0, 11, 7),
+    (3, 2, 9, 5),
+    # partly outside of the image, on each side
+    (3, 5, 9, 12),
+    (3, -4, 9, 3),
+    (-2, 1, 4, 6),
+    (8, 1, 15, 6),
+    (-3, -3, 14, 10),
+    # fully outside of the image
+    (2, 9, 6, 11),
+    (12, 2, 14, 4),
+    # empty
+    (4, 3, 4, 3),
+]
+
+
+def test_decode_region_matches_crop():
+    for mode in ("RGB", "RGBA"):
+        img = make_image(mode, 11, 7)
+        for compression in (0x00, 0x04):
+            img_data = ImageData.pack(img, compression)
+            for box in BOXES:
+                expected = img_data.unpack().crop(box)
+                region = img_data.decode_region(box)
+                assert region.size == expected.size, (mode, compression, box)
+                assert region.tobytes() == expected.tobytes(), (mode, compression, box)
+
+
+def test_compressed_decode_region_matches_crop():
+    for mode in ("RGB", "RGBA"):
+        img = make_image(mode, 11, 7)
+        compressed_data = ImageCompressedData.compress(img)
+        for box in BOXES:
+            region = compressed_data.decode_region(box)
+            expected = compressed_data.decompress().crop(box)
+            assert region.size == (box[2] - box[0], box[3] - box[1]), (mode, box)
+            assert region.tobytes() == expected.tobytes(), (mode, box)
+
+
+if __name__ == "__main__":
+    test_decode_region_matches_crop()
+    test_compressed_decode_region_matches_crop()
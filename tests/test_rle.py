@@ -0,0 +1,53 @@
+from PIL import Image
+
+from smawf import ImageCompressedData
+
+# widths around the 0x7F pixels limit of a single segment
+WIDTHS = [1, 0x7F, 0x80, 0x81]
+
+
+def make_image(mode: str, width: int) -> Image.Image:
+    """
+    Image with all equal line, all different line, line of pairs of equal
+    pixels and, for RGBA, line whose pixels differ only in alpha.
+    """
+    # distinct RGB565 values for up to 2048 pixels
+    different = [((x & 0x1F) << 3, ((x >> 5) & 0x3F) << 2, 0x80) for x in range(width)]
+    lines = [
+        [(0x40, 0x80, 0xC0)] * width,
+        different,
+        [different[x // 2] for x in range(width)],
+    ]
+    if mode == "RGBA":
+        lines = [[(*pixel, 0xFF) for pixel in line] for line in lines]
+        lines.append([(0x40, 0x80, 0xC0, x & 0xFF) for x in range(width)])
+    img = Image.new(mode, (width, len(lines)))
+    img.putdata([pixel for line in lines for pixel in line])
+    return img
+
+
+def test_decoders_match():
+    for mode in ("RGB", "RGBA"):
+        for width in WIDTHS:
+            img = make_image(mode, width)
+            for strategy in ("greedy", "optimal"):
+                compressed_data = ImageCompressedData.compress(img, strategy=strategy)
+                lines_info = compressed_data.lines_info
+                array_data = compressed_data._decompress_array(lines_info).tobytes()
+                bytes_data = compressed_data._decompress_bytes(lines_info)
+                assert array_data == bytes_data, (mode, width, strategy)
+                assert len(array_data) == len(img.tobytes()), (mode, width, strategy)
+
+
+def test_encoders_match():
+    for mode in ("RGB", "RGBA"):
+        for width in WIDTHS:
+            img = make_image(mode, width)
+            array_lines = ImageCompressedData._compress_array(img)
+            bytes_lines = ImageCompressedData._compress_bytes(img)
+            assert array_lines == bytes_lines, (mode, width)
+
+
+if __name__ == "__main__":
+    test_decoders_match()
+    test_encoders_match()
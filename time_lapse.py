@@ -0,0 +1,57 @@
+import argparse
+import pathlib
+import sys
+import time
+from datetime import timedelta
+
+from animation import ANIMATION_FORMATS, write_animation
+from cli_utils import parse_size
+from smawf import WatchFace
+
+
+def parse_time(value: str) -> timedelta:
+    """
+    Parse time given as `HH:MM[:SS]`.
+    """
+    try:
+        parts = [int(part) for part in value.split(":")]
+    except ValueError:
+        parts = []
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"Invalid time `{value}`, expected HH:MM[:SS]")
+    return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2] if len(parts) == 3 else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="SMA smart watches face time lapse",
+        description="Render watch face preview over a range of time as animated GIF, APNG or WebP image",
+    )
+    parser.add_argument("-i", "--input_file", type=pathlib.Path, required=True)
+    parser.add_argument(
+        "-o", "--output_file", type=pathlib.Path, required=True, help="output image, format given by its extension"
+    )
+    parser.add_argument("--start", type=parse_time, default=timedelta(), help="start time, HH:MM[:SS]")
+    parser.add_argument("--end", type=parse_time, default=timedelta(hours=12), help="end time, HH:MM[:SS]")
+    parser.add_argument("--step", type=parse_time, default=timedelta(minutes=1), help="time step, HH:MM[:SS]")
+    parser.add_argument("--size", type=parse_size, default=(410, 502), help="watch screen size, WIDTHxHEIGHT")
+    parser.add_argument("--duration", type=int, default=50, help="duration of each frame in milliseconds")
+    args = parser.parse_args()
+    if not args.input_file.exists():
+        print(f"Input file `{args.input_file}` does not exist")
+        sys.exit(-1)
+    extension = args.output_file.suffix[1:].upper()
+    format = {"APNG": "PNG", "GIF": "GIF", "PNG": "PNG", "WEBP": "WEBP"}.get(extension)
+    if format not in ANIMATION_FORMATS:
+        print(f"Unsupported output format `{args.output_file.suffix}`")
+        sys.exit(-2)
+    # time lapse past midnight
+    end = args.end if args.end > args.start else args.end + timedelta(days=1)
+    wf = WatchFace.open(args.input_file)
+    width, height = args.size
+    frames = wf.time_lapse(width, height, args.start, end, args.step)
+    start = time.perf_counter()
+    with open(args.output_file, "wb") as f:
+        num_frames = write_animation(f, frames, format, args.duration)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print(f"Rendered {num_frames} frames in {elapsed:.2f} s ({num_frames / elapsed:.1f} frames/s)")
@@ -62,6 +62,9 @@ class WatchFaceLayer(QListWidgetItem):
         self.image_item = img_item
         self.block_info = block_info
         self.images = images
+        # encoded images, kept until the images or their encoding parameters change
+        self.imgs_data = None
+        self.imgs_data_key = None
 
         self.widget = QWidget()
         self.image_combobox = QComboBox()
@@ -138,8 +141,9 @@ class WatchFaceLayer(QListWidgetItem):
         self.num_images_lineedit.setText(str(block_info.num_imgs))
         self.num_images_lineedit.setMaximumWidth(70)
 
+        self.auto_compression = False
         self.compression_combobox = QComboBox()
-        self.compression_combobox.addItems(["0x00", "0x04"])
+        self.compression_combobox.addItems(["0x00", "0x04", "Auto"])
         if block_info.compr == 0x00:
             self.compression_combobox.setCurrentIndex(0)
         elif block_info.compr == 0x04:
@@ -239,6 +243,7 @@ class WatchFaceLayer(QListWidgetItem):
                 QMessageBox.critical(None, "Image size mismatch", "All images must have the same width and height")
                 return
             self.images = images
+            self.imgs_data = None
             self.width_spinbox.blockSignals(True)
             self.height_spinbox.blockSignals(True)
             self.width_spinbox.setValue(images[0].width)
@@ -254,6 +259,21 @@ class WatchFaceLayer(QListWidgetItem):
     def get_images(self):
         return self.images
 
+    def get_encoding_key(self):
+        bi = self.block_info
+        return bi.width, bi.height, bi.is_rgba, "auto" if self.auto_compression else bi.compr
+
+    def is_dirty(self):
+        """
+        Whether the images must be encoded again, because the images, their size,
+        RGBA flag or compression changed since they were last encoded.
+        """
+        return self.imgs_data is None or self.imgs_data_key != self.get_encoding_key()
+
+    def set_imgs_data(self, imgs_data):
+        self.imgs_data = imgs_data
+        self.imgs_data_key = self.get_encoding_key()
+
     def update_width(self):
         if not self.image_item.pixmap().isNull():
             aspect_ratio = self.image_item.pixmap().height() / self.image_item.pixmap().width()
@@ -306,7 +326,10 @@ class WatchFaceLayer(QListWidgetItem):
         self.block_info.pos_y = self.y_spinbox.value()
         self.block_info.cent_x = self.rot_x_spinbox.value()
         self.block_info.cent_y = self.rot_y_spinbox.value()
-        self.block_info.compr = 0 if self.compression_combobox.currentIndex() == 0 else 4
+        # with automatic compression, the compression is selected when the watch face is created
+        self.auto_compression = self.compression_combobox.currentIndex() == 2
+        if not self.auto_compression:
+            self.block_info.compr = 0 if self.compression_combobox.currentIndex() == 0 else 4
         self.block_info.num_imgs = len(self.images)
         self.block_info.is_rgba = self.rgba_checkbox.isChecked()
         if self.pixmap is not None: